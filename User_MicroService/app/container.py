@@ -0,0 +1,138 @@
+import os
+import asyncio
+import logging
+from sqlalchemy import text
+from aiokafka.partitioner import DefaultPartitioner
+from app.database import async_engine, AsyncSessionLocal, Base
+from app.services import http_client
+from app.services.kafka_producer import ReplyProducer
+from app.services.verification_pool import shutdown_verification_pool
+from app.services.outbox import OutboxRelay
+from app.services.codecs import encode_message, check_topic_codecs
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_container")
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS')
+KAFKA_SHUTDOWN_TIMEOUT = float(os.getenv('KAFKA_SHUTDOWN_TIMEOUT', '10'))
+CONNECT_BACKOFF = float(os.getenv('CONNECT_BACKOFF', '1'))
+CONNECT_BACKOFF_MAX = float(os.getenv('CONNECT_BACKOFF_MAX', '30'))
+READINESS_DB_TIMEOUT = float(os.getenv('READINESS_DB_TIMEOUT', '2'))
+
+# Backend states reported by the readiness probe
+PENDING = "pending"
+CONNECTED = "connected"
+DISABLED = "disabled"
+
+
+class Container:
+    """
+    Owns the service's backend clients for the lifetime of the app.
+
+    `start()` returns immediately: MySQL and Kafka are connected by background
+    tasks that retry with backoff, and `readiness()` reports which backends
+    are actually reachable. Kafka is disabled when KAFKA_BOOTSTRAP_SERVERS is unset.
+    """
+
+    def __init__(self):
+        self.producer = ReplyProducer(
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            # Values are encoded per topic by the codec layer, which also sets their content-type header
+            encoder=encode_message,
+            key_serializer=lambda k: k.encode('utf-8') if k is not None else None,
+            # Hashes the key, so every reply for a correlation id lands on the same partition
+            partitioner=DefaultPartitioner()
+        )
+        self.outbox_relay = OutboxRelay(self.producer, AsyncSessionLocal)
+        self.batch_consumers = []
+        self.status = {}
+        self._consumer_tasks = []
+        self._connect_tasks = []
+
+    async def start(self, batch_consumer_factory) -> None:
+        # Shared keep-alive HTTP client for Cognito, closed on shutdown
+        await http_client.startup()
+
+        self.status = {"database": PENDING, "kafka": PENDING if KAFKA_BOOTSTRAP_SERVERS else DISABLED}
+        self._connect_tasks = [asyncio.create_task(self._retry("database", self._connect_database))]
+        if KAFKA_BOOTSTRAP_SERVERS:
+            check_topic_codecs()
+            connect_kafka = lambda: self._connect_kafka(batch_consumer_factory)
+            self._connect_tasks.append(asyncio.create_task(self._retry("kafka", connect_kafka)))
+
+    async def stop(self) -> None:
+        for task in self._connect_tasks:
+            task.cancel()
+        await asyncio.gather(*self._connect_tasks, return_exceptions=True)
+
+        await self._stop_batch_consumers()
+        shutdown_verification_pool()
+        # Deliver the replies still buffered by the producer
+        await self.producer.close()
+        await http_client.shutdown()
+
+    async def readiness(self) -> dict:
+        """
+        Return the state of each backend, pinging MySQL so a lost connection is noticed.
+        """
+        status = dict(self.status)
+        if status.get("database") == CONNECTED:
+            try:
+                await asyncio.wait_for(self._ping_database(), READINESS_DB_TIMEOUT)
+            except Exception as e:
+                status["database"] = f"unreachable: {e}"
+        if status.get("kafka") == CONNECTED:
+            stopped = [c.name for c in self.batch_consumers if c.consumer is None]
+            if not self.producer.started or stopped:
+                status["kafka"] = f"reconnecting: {', '.join(stopped) or 'producer'}"
+        return status
+
+    async def _retry(self, name: str, connect) -> None:
+        backoff = CONNECT_BACKOFF
+        while True:
+            try:
+                await connect()
+                self.status[name] = CONNECTED
+                logger.info(f"Connected to {name}")
+                return
+            except Exception as e:
+                logger.info(f"Could not connect to {name}, retrying in {backoff}s: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, CONNECT_BACKOFF_MAX)
+
+    async def _connect_database(self) -> None:
+        # Cria as tabelas no banco de dados
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def _ping_database(self) -> None:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _connect_kafka(self, batch_consumer_factory) -> None:
+        await self.producer.start()
+
+        # Kafka consumers run as supervised tasks on the app's event loop
+        self.batch_consumers = batch_consumer_factory(self.producer)
+        self._consumer_tasks = [asyncio.create_task(c.run()) for c in self.batch_consumers]
+        # Publishes the events committed to the outbox, retrying until the database is reachable
+        self._consumer_tasks.append(asyncio.create_task(self.outbox_relay.run()))
+
+    async def _stop_batch_consumers(self) -> None:
+        """
+        Let each consumer and the outbox relay finish their current batch, cancelling any that overrun the timeout.
+        """
+        for batch_consumer in self.batch_consumers:
+            batch_consumer.stop()
+        self.outbox_relay.stop()
+        if not self._consumer_tasks:
+            return
+        done, pending = await asyncio.wait(self._consumer_tasks, timeout=KAFKA_SHUTDOWN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._consumer_tasks = []
+
+
+container = Container()
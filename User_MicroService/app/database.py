@@ -1,7 +1,10 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
+from app.pool_metrics import PoolMetrics, timed_pool_class, instrument_engine
+from app.metrics import instrument_queries
 import logging
 
 
@@ -21,22 +24,49 @@ db_user = os.getenv('DB_USER')
 db_password = os.getenv('DB_PASSWORD')
 db_host = os.getenv('DB_HOST')
 db_name = os.getenv('DB_NAME')
-db_port = os.getenv('DB_PORT')
+db_port = os.getenv('DB_PORT', '3306')
 
-URL_DATABASE = f'mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+ASYNC_URL_DATABASE = f'mysql+aiomysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Keep below MySQL's wait_timeout so the server never closes a pooled connection first
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+pool_metrics = {
+    "async": PoolMetrics(),
+}
+
+def pool_options(pool_class, metrics: PoolMetrics) -> dict:
+    return {
+        "poolclass": timed_pool_class(pool_class, metrics),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
 
 logger.info(f"Database URL CONNECTED")
 
-engine = create_engine(URL_DATABASE)
+# Async engine, shared by the HTTP routes and the Kafka consumers so queries do not block the event loop
+async_engine = create_async_engine(ASYNC_URL_DATABASE, **pool_options(AsyncAdaptedQueuePool, pool_metrics["async"]))
+instrument_engine(async_engine.sync_engine, pool_metrics["async"])
+instrument_queries(async_engine.sync_engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 # Dependência para obter uma sessão do banco de dados
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+def get_pool_status() -> dict:
+    return {
+        "async": pool_metrics["async"].snapshot(async_engine.pool),
+    }
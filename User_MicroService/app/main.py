@@ -1,20 +1,158 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, SessionLocal
-from app.models.models import Base, User
-from app.routes import user_routes, auth_routes
-from app.services.auth_service import decode_jwt
-from kafka import KafkaConsumer, KafkaProducer
-import threading
-import json
+from app.database import AsyncSessionLocal
+from app.container import container
+from app.routes import user_routes, auth_routes, admin_routes, health_routes, metrics_routes
+from app.metrics import MetricsMiddleware
+from app.services.user_service import get_tenants_data, create_users
+from app.services.batch_consumer import BatchConsumer, Reply, correlation_id_of, after_commit
+from app.services.user_cache import user_cache
+from app.services.idempotency import IdempotencyStore, idempotent
+from app.services.verification_pool import get_verification_pool
+from aiokafka import AIOKafkaConsumer
+from functools import partial
 import os
-import uuid
 import logging
 
-app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("user_service")
 
+def create_consumer(topic: str, group_id: str) -> AIOKafkaConsumer:
+    return AIOKafkaConsumer(
+        topic,
+        bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS'),
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        group_id=group_id
+        # Values stay raw bytes: BatchConsumer decodes them with the codec named in their content-type header
+    )
+
+async def process_validation_request(messages, db):
+    requests = []
+    access_tokens = []
+    for message in messages:
+        action = message.value.get("action")
+        if action == "validate_token":
+            tokens = [message.value.get("access_token")]
+        elif action == "validate_tokens":
+            tokens = message.value.get("access_tokens") or []
+        else:
+            continue
+        requests.append((message, action, len(access_tokens), len(tokens)))
+        access_tokens.extend(tokens)
+
+    # Every token of the batch is verified in one pass, grouped by signing key; results come back in request order
+    replies = []
+    results = await get_verification_pool().verify_tokens(access_tokens)
+    for message, action, start, count in requests:
+        correlation_id = correlation_id_of(message)
+
+        if action == "validate_tokens":
+            # One reply with a result per token, in the order they were sent
+            token_results = []
+            expiries = []
+            for user, error in results[start:start + count]:
+                if error is not None:
+                    token_results.append({"cognito_id": None, "error": getattr(error, "detail", None) or str(error)})
+                else:
+                    token_results.append({"cognito_id": user.get("sub")})
+                    if user.get("exp") is not None:
+                        expiries.append(user["exp"])
+            response = {"results": token_results, "correlation_id": correlation_id}
+            # Replayed only while every token it calls valid still is
+            replies.append(Reply('user-validation-response', response, correlation_id, correlation_id, message,
+                                 min(expiries, default=None)))
+            continue
+
+        user, error = results[start]
+        if error is not None:
+            logger.info(f"Error validating token: {error}")
+            continue
+
+        validated_user = {
+            "cognito_id": user.get("sub"),
+            "correlation_id": correlation_id,
+        }
+
+        replies.append(Reply('user-validation-response', validated_user, correlation_id or user.get("sub"), correlation_id, message,
+                             user.get("exp")))
+    return replies
+
+async def handle_user_creation(messages, db):
+    replies = []
+    for message in messages:
+        request_data = message.value
+        if request_data.get("action") == "create_user":
+            user_data = request_data.get("user_data")
+            logger.info(f"Creating user: {user_data.get('email')}")
+
+            #se o user já estiver cirado devolve o cognitoid, agora como tenant
+            # create_users queues user.created for a new user and user.updated only when the role changes
+            [result] = await create_users(db, [{"name": user_data["name"], "email": user_data["email"]}], role="tenant")
+            cognito_id = result["cognito_id"]
+            logger.info(f"User {user_data['email']} is a tenant with cognito_id: {cognito_id}")
+            # Dropped only after the commit, so a concurrent read cannot cache the old role again
+            after_commit(db, partial(user_cache.delete, cognito_id))
+
+            # Sent once the whole batch has been committed
+            correlation_id = correlation_id_of(message)
+            response = {"cognito_id": cognito_id, "correlation_id": correlation_id}
+            replies.append(Reply('user-creation-response', response, correlation_id or cognito_id, correlation_id, message))
+        elif request_data.get("action") == "create_users":
+            users = request_data.get("users") or []
+            logger.info(f"Creating {len(users)} users")
+
+            # One upsert per chunk; existing users become tenants like with create_user
+            results = await create_users(db, users, role="tenant")
+            after_commit(db, partial(user_cache.delete, *[result["cognito_id"] for result in results if result["cognito_id"]]))
+
+            correlation_id = correlation_id_of(message)
+            response = {"users": results, "correlation_id": correlation_id}
+            replies.append(Reply('user-creation-response', response, correlation_id, correlation_id, message))
+    return replies
+
+async def handle_tenant_data(messages, db):
+    replies = []
+    for message in messages:
+        request_data = message.value
+
+        logger.info(f"Received tenant data request for {len(request_data.get('tenant_ids') or [])} tenants")
+
+        if request_data.get("action") == "get_tenants_data":
+            tenant_data = await get_tenants_data(db, request_data.get("tenant_ids"))
+            # The payload is keyed by tenant id, so the correlation id only travels in the key and header
+            correlation_id = correlation_id_of(message)
+            replies.append(Reply('tenant_info_response', tenant_data, correlation_id, correlation_id, message))
+    return replies
+
+# Redelivered requests are answered with the replies recorded the first time.
+# Validation writes nothing, so its records only live in memory, briefly: a
+# token's answer must not outlive the token.
+user_creation_requests = IdempotencyStore()
+validation_requests = IdempotencyStore(ttl=float(os.getenv('IDEMPOTENCY_VALIDATION_TTL', '60')), persistent=False)
+
+def create_batch_consumers(producer) -> list:
+    return [
+        BatchConsumer("validation", lambda: create_consumer('user-validation-request', 'user_group'),
+                      producer, idempotent(process_validation_request, validation_requests)),
+        BatchConsumer("user creation", lambda: create_consumer('user-creation-request', 'user_creation_group'),
+                      producer, idempotent(handle_user_creation, user_creation_requests), AsyncSessionLocal),
+        BatchConsumer("tenant data", lambda: create_consumer('tenant_info_request', 'tenant_group'),
+                      producer, handle_tenant_data, AsyncSessionLocal),
+    ]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Backends connect in the background; /health/ready reports when they are reachable
+    await container.start(create_batch_consumers)
+    try:
+        yield
+    finally:
+        await container.stop()
+
+app = FastAPI(lifespan=lifespan)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,155 +160,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Cria as tabelas no banco de dados
-Base.metadata.create_all(bind=engine)
+# Outermost, so the whole request is timed
+app.add_middleware(MetricsMiddleware)
 
 # Inclui as rotas de usuários
 app.include_router(user_routes.router)
 app.include_router(auth_routes.router)
-
-# Kafka consumer setup
-consumer = KafkaConsumer(
-    'user-validation-request',
-    bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS'),
-    auto_offset_reset='earliest',
-    group_id='user_group',
-    value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-)
-
-# New Kafka consumer for user creation
-user_creation_consumer = KafkaConsumer(
-    'user-creation-request',
-    bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS'),
-    auto_offset_reset='earliest',
-    group_id='user_creation_group',
-    value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-)
-
-# Kafka consumer to tenant data
-tenant_consumer = KafkaConsumer(
-    'tenant_info_request',
-    bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS'),
-    auto_offset_reset='earliest',
-    group_id='tenant_group',
-    value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-)
-
-producer = KafkaProducer(
-    bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS'),
-    value_serializer=lambda v: json.dumps(v).encode('utf-8')
-)
-
-logger.info("Connected to Kafka")
-
-def process_validation_request():
-    try:
-        for message in consumer:
-            request_data = message.value
-            if request_data.get("action") == "validate_token":
-                access_token = request_data.get("access_token")
-                
-                user = decode_jwt(access_token, access_token)
-
-                # Replace with your actual token validation logic
-                validated_user = {
-                    "cognito_id": user.get("sub"),
-                }
-
-                producer.send('user-validation-response', validated_user)
-                
-    except Exception as e:
-        logger.info(f"Error in Kafka consumer loop: {e}")
-
-def handle_user_creation():
-    for message in user_creation_consumer:
-        request_data = message.value
-        if request_data.get("action") == "create_user":
-            user_data = request_data.get("user_data")
-            logger.info(f"Creating user: {user_data}")
-
-            #se o user já estiver cirado devolve o cognitoid
-            db = SessionLocal()
-            user = db.query(User).filter(User.email == user_data["email"]).first()
-
-            if user:
-                logger.info(f"User already exists with cognito_id: {user.cognito_id}")
-                #change the user role to tenant
-                user.role = "tenant"
-                db.commit()
-                db.refresh(user)
-                producer.send('user-creation-response', {"cognito_id": user.cognito_id})
-                db.close()
-            else:
-
-                new_cognito_id = str(uuid.uuid4())
-
-                db_user = User(
-                    cognito_id = new_cognito_id, # Replace with actual ID from user creation logic
-                    name=user_data["name"],
-                    email=user_data["email"],
-                    role="tenant"
-                )
-
-                db = SessionLocal()
-                db.add(db_user)
-                db.commit()
-                db.refresh(db_user)
-                db.close()
-
-                try:
-                    cognito_id = db_user.cognito_id 
-
-                    logger.info(f"User created with cognito_id: {cognito_id}")
-                    # Send confirmation response back to Kafka
-                    producer.send('user-creation-response', {"cognito_id": cognito_id})
-                except Exception as e:
-                    logger.info(f"Error creating user: {e}")
-
-def handle_tenant_data():
-    for message in tenant_consumer:
-        request_data = message.value
-
-        logger.info(f"Received tenant data request: {request_data}")
-
-        if request_data.get("action") == "get_tenants_data":
-            
-            tenant_data = {}
-            
-            tenants_ids = request_data.get("tenant_ids")
-
-
-            db = SessionLocal()
-            for tenant_id in tenants_ids:
-                tenant = db.query(User).filter(User.cognito_id == tenant_id).first()
-                logger.info(f"Tenant: {tenant}")
-                tenant_data2 = []
-                tenant_data2.append(tenant.name)
-                tenant_data2.append(tenant.email)
-
-                tenant_data[tenant_id] = tenant_data2
-            db.close()
-
-            producer.send('tenant_info_response', tenant_data)
-
-# Start Kafka consumer in a background thread when the FastAPI app starts
-@app.on_event("startup")
-def startup_event():
-    try:
-        # Start thread for process_validation_request
-        validation_thread = threading.Thread(target=process_validation_request, daemon=True)
-        validation_thread.start()
-        logger.info("Kafka validation consumer thread started")
-
-        # Start thread for user creation processing
-        user_creation_thread = threading.Thread(target=handle_user_creation, daemon=True)
-        user_creation_thread.start()
-        logger.info("Kafka user creation consumer thread started")
-
-        tenant_consumer_thread = threading.Thread(target=handle_tenant_data, daemon=True)
-        tenant_consumer_thread.start()
-        logger.info("Kafka tenant data consumer thread started")
-        
-    except Exception as e:
-        logger.info(f"Error starting Kafka consumer threads: {e}")
+app.include_router(admin_routes.router)
+app.include_router(health_routes.router)
+app.include_router(metrics_routes.router)
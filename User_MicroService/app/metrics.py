@@ -0,0 +1,121 @@
+import time
+from contextvars import ContextVar
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "user_service_http_request_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+JWT_VERIFY_SECONDS = Histogram(
+    "user_service_jwt_verify_seconds", "JWT verification time, split into the JWKS key lookup and the signature check",
+    ["stage"],
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+DB_QUERY_SECONDS = Histogram(
+    "user_service_db_query_seconds", "Database statement duration by call site (route or consumer)",
+    ["call_site"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+KAFKA_BATCH_SECONDS = Histogram(
+    "user_service_kafka_batch_seconds", "Time to handle a consumed batch, commit included",
+    ["consumer"],
+)
+KAFKA_MESSAGES = Counter(
+    "user_service_kafka_messages", "Messages consumed",
+    ["consumer"],
+)
+KAFKA_CONSUMER_LAG = Gauge(
+    "user_service_kafka_consumer_lag", "Messages between the last consumed offset and the partition's high watermark",
+    ["topic", "partition"],
+)
+KAFKA_SEND_SECONDS = Histogram(
+    "user_service_kafka_send_seconds", "Producer send-to-acknowledgement latency",
+    ["topic"],
+)
+
+# What the current task is serving, for attributing database statements:
+# the ASGI scope of an HTTP request, or an explicit name such as a consumer's
+_call_site = ContextVar("call_site", default=None)
+_http_scope = ContextVar("http_scope", default=None)
+
+
+def set_call_site(name: str) -> None:
+    _call_site.set(name)
+
+
+def current_call_site() -> str:
+    name = _call_site.get()
+    if name is not None:
+        return name
+    scope = _http_scope.get()
+    if scope is not None:
+        # The route is only known once the router has matched the request
+        route = scope.get("route")
+        return f"http {route.path}" if route is not None else "http"
+    return "other"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware observing each HTTP request's latency, labelled by route template rather than raw path.
+
+    The time runs until the response has been fully sent, so streamed responses are measured whole.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        token = _http_scope.set(scope)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _http_scope.reset(token)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def instrument_queries(engine: Engine) -> None:
+    """
+    Time every statement executed by `engine`, labelled with `current_call_site()`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "query_start", None)
+        if start is not None:
+            DB_QUERY_SECONDS.labels(current_call_site()).observe(time.perf_counter() - start)
+
+
+def record_consumer_lag(consumer, records: dict) -> None:
+    """
+    Update the lag of each partition in a `getmany()` result from the consumer's high watermarks.
+    """
+    for partition, messages in records.items():
+        highwater = consumer.highwater(partition)
+        if messages and isinstance(highwater, int):
+            KAFKA_CONSUMER_LAG.labels(partition.topic, str(partition.partition)).set(
+                max(highwater - messages[-1].offset - 1, 0)
+            )
@@ -1,10 +1,103 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index, func, select, update as sql_update
+from sqlalchemy.dialects import mysql, sqlite
 from app.database import Base
 
+# Added to the id an upsert leaves in LAST_INSERT_ID() when it hits an existing row, so that
+# it cannot be mistaken for the id of an inserted one; far above any auto-increment id
+EXISTING_ROW_ID_OFFSET = 2 ** 62
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
     cognito_id = Column(String(255), index=True, unique=True)
     name = Column(String(100))
     email = Column(String(100), unique=True, index=True)
-    role = Column(String(100), nullable=True)
\ No newline at end of file
+    role = Column(String(100), nullable=True)
+    # Watermark of the incremental export; upserts set it explicitly
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Keyset pages of GET /users filtered by role
+        Index("ix_users_role_id", "role", "id"),
+        # Incremental exports, in (updated_at, id) order
+        Index("ix_users_updated_at_id", "updated_at", "id"),
+    )
+
+    @classmethod
+    def upsert_statement(cls, dialect_name: str, rows, update=()):
+        """
+        Build an INSERT of `rows` that, on a duplicate key, only overwrites the columns named in `update`.
+
+        MySQL gets `INSERT ... ON DUPLICATE KEY UPDATE`, which also stores the
+        id of the existing row, plus EXISTING_ROW_ID_OFFSET, in
+        LAST_INSERT_ID(); SQLite, used by the tests, the equivalent
+        `ON CONFLICT (email)` clause. Updated rows get a new `updated_at`.
+        """
+        if dialect_name == "mysql":
+            stmt = mysql.insert(cls).values(rows)
+            values = {name: stmt.inserted[name] for name in update}
+            if values:
+                values["updated_at"] = func.now()
+            # The id itself is left unchanged
+            existing_id = func.last_insert_id(cls.__table__.c.id + EXISTING_ROW_ID_OFFSET) - EXISTING_ROW_ID_OFFSET
+            return stmt.on_duplicate_key_update(id=existing_id, **values)
+        if dialect_name == "sqlite":
+            stmt = sqlite.insert(cls).values(rows)
+            if not update:
+                return stmt.on_conflict_do_nothing()
+            values = {name: stmt.excluded[name] for name in update}
+            values["updated_at"] = func.now()
+            return stmt.on_conflict_do_update(index_elements=[cls.email], set_=values)
+        raise ValueError(f"Upsert is not supported on {dialect_name}")
+
+    @classmethod
+    async def upsert(cls, db, values: dict, update=()) -> tuple:
+        """
+        Insert a user, or keep the one already registered with that email; return the resulting row and whether it was inserted.
+
+        Columns named in `update` are overwritten on the existing row. On
+        MySQL this is a single statement, so concurrent calls for one email
+        never hit the unique index: they all get the same row, which is then
+        read by the primary key left in LAST_INSERT_ID(). Whether the row was
+        inserted comes from the same statement, so exactly one of them is told
+        it was. SQLite inserts with `ON CONFLICT DO NOTHING RETURNING` and
+        reads or updates the existing row when nothing was returned.
+        """
+        dialect_name = db.get_bind().dialect.name
+        if dialect_name == "sqlite":
+            stmt = sqlite.insert(cls).values(values).on_conflict_do_nothing(index_elements=[cls.email]).returning(cls)
+            user = (await db.execute(stmt, execution_options={"populate_existing": True})).scalars().one_or_none()
+            if user is not None:
+                return user, True
+            if update:
+                stmt = (sql_update(cls).where(cls.email == values["email"])
+                        .values(**{name: values[name] for name in update}, updated_at=func.now()).returning(cls))
+            else:
+                stmt = select(cls).where(cls.email == values["email"])
+            return (await db.execute(stmt, execution_options={"populate_existing": True})).scalars().one(), False
+
+        result = await db.execute(cls.upsert_statement(dialect_name, values, update))
+        created = result.lastrowid < EXISTING_ROW_ID_OFFSET
+        return await db.get(cls, result.lastrowid % EXISTING_ROW_ID_OFFSET, populate_existing=True), created
+
+
+class OutboxEvent(Base):
+    """
+    A Kafka message written in the same transaction as the change it describes, until the relay publishes it.
+    """
+    __tablename__ = 'outbox_events'
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(255), nullable=False)
+    key = Column(String(255), nullable=True)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class ProcessedRequest(Base):
+    """
+    A Kafka request already handled, with the replies it produced, kept until `expires_at` to answer redeliveries.
+    """
+    __tablename__ = 'processed_requests'
+    request_key = Column(String(64), primary_key=True)
+    replies = Column(JSON, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
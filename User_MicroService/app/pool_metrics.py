@@ -0,0 +1,84 @@
+import time
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+
+class PoolMetrics:
+    """
+    Counters for one connection pool: checkouts, time spent waiting for a
+    connection, checkout timeouts, new connections and invalidations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_checkout(self, wait: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        data = {
+            "pool_class": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "checkout_wait_avg_ms": 1000 * self.checkout_wait_total / self.checkouts if self.checkouts else 0.0,
+            "checkout_wait_max_ms": 1000 * self.checkout_wait_max,
+            "checkout_timeouts": self.checkout_timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+        }
+        # Only queue pools report size and overflow
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                data[name] = getattr(pool, name)()
+        return data
+
+
+def timed_pool_class(base, metrics: PoolMetrics):
+    """
+    Return a subclass of the pool class `base` that reports checkout waits to `metrics`.
+
+    The metrics live on the class, so they survive `Pool.recreate()` after a disconnect.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = base._do_get(self)
+        except exc.TimeoutError:
+            metrics.record_timeout()
+            raise
+        metrics.record_checkout(time.perf_counter() - start)
+        return record
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+def instrument_engine(engine: Engine, metrics: PoolMetrics) -> None:
+    """
+    Count new connections and invalidations (including failed pre-pings) on `engine`.
+    """
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
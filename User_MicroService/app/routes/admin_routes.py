@@ -0,0 +1,94 @@
+import io
+import csv
+import orjson
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_pool_status
+from app.container import container
+from app.models.models import OutboxEvent
+from app.services.auth_service import require_admin
+from app.services.user_cache import user_cache
+from app.services.session_tokens import session_keyring, SESSION_TOKENS_ENABLED
+from app.services.user_service import export_watermark, iter_user_export, EXPORT_FIELDS
+import logging
+
+router = APIRouter()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_admin_routes")
+
+@router.get("/admin/db/pool", status_code=status.HTTP_200_OK)
+async def db_pool_status():
+    """
+    Report connection pool usage: checked-out connections, overflow, checkout wait time and invalidations.
+    """
+    return get_pool_status()
+
+@router.get("/admin/kafka/producer", status_code=status.HTTP_200_OK)
+async def kafka_producer_status():
+    """
+    Report Kafka reply delivery: sent, delivered and failed messages, messages awaiting acknowledgement and send latency.
+    """
+    return container.producer.stats()
+
+@router.get("/admin/kafka/outbox", status_code=status.HTTP_200_OK)
+async def kafka_outbox_status(db: AsyncSession = Depends(get_db)):
+    """
+    Report the outbox relay: events published, batches, failures and events still waiting in the outbox.
+    """
+    pending = await db.scalar(select(func.count()).select_from(OutboxEvent))
+    return {**container.outbox_relay.stats(), "pending": pending}
+
+@router.get("/admin/cache/users", status_code=status.HTTP_200_OK)
+async def user_cache_status():
+    """
+    Report the user cache backend, its size and its hit and miss counts.
+    """
+    return user_cache.stats()
+
+@router.get("/admin/auth/session-keys", status_code=status.HTTP_200_OK)
+async def session_keys_status():
+    """
+    Report whether session tokens are enabled and the state of their signing keyring; secrets are never returned.
+    """
+    return {"enabled": SESSION_TOKENS_ENABLED, **session_keyring.stats()}
+
+@router.get("/admin/users/export", status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
+async def export_users(format: str = "ndjson", updated_since: Optional[datetime] = None,
+                       db: AsyncSession = Depends(get_db)):
+    """
+    Stream the users updated since `updated_since` (all users without it) as NDJSON or CSV. Admins only.
+
+    The `X-Export-Watermark` response header is the `updated_since` to pass to
+    the next incremental export. It trails the current time by
+    USER_EXPORT_SAFETY_LAG, so the latest changes come with the next export.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+    until = await export_watermark(db)
+    batches = iter_user_export(db, until, updated_since)
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    body = stream_ndjson(batches) if format == "ndjson" else stream_csv(batches)
+    return StreamingResponse(body, media_type=media_type, headers={"X-Export-Watermark": until.isoformat()})
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def stream_ndjson(batches):
+    async for batch in batches:
+        yield b"".join(orjson.dumps({field: export_value(value) for field, value in row.items()}) + b"\n" for row in batch)
+
+async def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    async for batch in batches:
+        writer.writerows([export_value(row[field]) for field in EXPORT_FIELDS] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
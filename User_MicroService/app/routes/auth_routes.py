@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Response, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from urllib.parse import urlencode
-from sqlalchemy.orm import Session
+from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import RedirectResponse
 from app.database import get_db
+from app.services.user_queries import get_user_row
 from app.services import auth_service  # Import the service here
-import requests
+from app.services import session_tokens
 import os
 import logging
 
@@ -33,14 +35,14 @@ async def login_redirect():
 
 
 @router.get("/callback")
-async def callback(request: Request, response: Response, db: Session = Depends(get_db)):
+async def callback(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     
     code = request.query_params.get("code")
     if not code:
         raise HTTPException(status_code=400, detail="Authorization code missing")
 
     # Exchange code for tokens
-    tokens = auth_service.exchange_code_for_tokens(code)
+    tokens = await auth_service.exchange_code_for_tokens(code)
     id_token = tokens.get("id_token")
     access_token = tokens.get("access_token")
 
@@ -48,19 +50,47 @@ async def callback(request: Request, response: Response, db: Session = Depends(g
         raise HTTPException(status_code=400, detail="ID or Access Token missing")
 
     # Decode the id_token, passing access_token for at_hash validation
-    user_info = auth_service.decode_jwt(id_token, access_token)
+    user_info = await auth_service.decode_jwt_async(id_token, access_token)
  
-    user = auth_service.get_or_create_user(user_info, db)
+    user = await auth_service.get_or_create_user(user_info, db)
 
     # Store access token in a secure, HTTP-only cookie
     redirect_response = RedirectResponse(url="http://localhost:3000/")
     redirect_response.set_cookie(key="access_token", value=access_token, httponly=False, max_age=3600, secure=True, samesite="strict")
+    if session_tokens.SESSION_TOKENS_ENABLED:
+        session_tokens.set_session_cookie(redirect_response, user)
 
     string = f"Bem Vindo: {user.name} - {user.email}"
     redirect_response.message = string
     logger.info(f"User logged in: {user}")
     return redirect_response
 
+@router.post("/auth/refresh")
+async def refresh_session(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Issue a new session token while the Cognito access token is still valid.
+
+    The user is read again, so a changed role or profile reaches the new token.
+    """
+    if not session_tokens.SESSION_TOKENS_ENABLED:
+        raise HTTPException(status_code=404, detail="Session tokens are disabled")
+
+    access_token = request.cookies.get("access_token")
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Access token missing from cookies")
+    try:
+        payload = await auth_service.validate_access_token_async(access_token)
+    except (ValueError, JWTError):
+        raise HTTPException(status_code=401, detail="Token validation failed")
+
+    user = await get_user_row(db, payload.get("sub"))
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    response = JSONResponse({"expires_in": session_tokens.SESSION_TOKEN_TTL})
+    session_tokens.set_session_cookie(response, user)
+    return response
+
 @router.get("/auth/logout")
 async def logout():
     cognito_logout_url = (
@@ -69,5 +99,6 @@ async def logout():
     )
     response = RedirectResponse(url=cognito_logout_url)
     response.delete_cookie(key="access_token")
+    response.delete_cookie(key=session_tokens.SESSION_COOKIE)
     logger.info(f"User logged out")
     return response
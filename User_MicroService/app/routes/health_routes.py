@@ -0,0 +1,27 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from app.container import container, CONNECTED, DISABLED
+import logging
+
+router = APIRouter()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_health_routes")
+
+@router.get("/health/live", status_code=status.HTTP_200_OK)
+async def liveness():
+    """
+    The process is up and serving requests.
+    """
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    """
+    Ready once every configured backend (MySQL, Kafka) is connected; 503 until then.
+    """
+    backends = await container.readiness()
+    ready = all(state in (CONNECTED, DISABLED) for state in backends.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "not ready", "backends": backends},
+    )
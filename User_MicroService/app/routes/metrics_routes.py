@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+import logging
+
+router = APIRouter()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_metrics_routes")
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint: HTTP, JWT, database and Kafka latency histograms and consumer lag.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
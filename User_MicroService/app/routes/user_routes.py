@@ -1,27 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.schemas import UserResponse, UserBase
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas import UserResponse, UserBase, BulkUserRequest, BulkUserResponse
 from app.database import get_db
 import app.models.models as models
 from app.models.updateUser import UpdateProfileSchema
-from app.services.auth_service import get_current_user
+from app.services.auth_service import get_current_user, require_admin, is_admin, check_assignable_role
+from app.services.user_cache import user_cache, USER_FIELDS
+from app.services import session_tokens
+from app.services.user_queries import email_exists
+from app.responses import FastJSONResponse, user_response
+from app.services.outbox import add_user_event, USER_CREATED, USER_UPDATED
+from app.services.user_service import create_users, iter_users, CREATED, USER_BULK_MAX_ROWS, \
+    USER_LIST_DEFAULT_LIMIT, USER_LIST_MAX_LIMIT
+import orjson
 import logging
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("user_service_user_routes")
 
 @router.post("/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(user: UserBase, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
+async def create_user(user: UserBase, db: AsyncSession = Depends(get_db)):
+    check_assignable_role(user.role)
+    if await email_exists(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     db_user = models.User(**user.model_dump())
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    add_user_event(db, USER_CREATED, db_user)
+    await db.commit()
+    await db.refresh(db_user)
     logger.info(f"User created: {db_user}")
-    return db_user
+    return user_response(db_user, status_code=status.HTTP_201_CREATED)
+
+@router.post("/users/bulk", response_model=BulkUserResponse, status_code=status.HTTP_200_OK)
+async def create_users_bulk(request: BulkUserRequest, http_request: Request,
+                            current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Create many users at once, with one upsert per chunk. Already registered emails are left unchanged.
+
+    For landlords and admins. Only admins choose the users' cognito_id and
+    role; for landlords they are generated and left unset.
+    """
+    privileged = await is_admin(http_request, current_user)
+    if not privileged and current_user.role != "landlord":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only landlords and admins can create users")
+    if len(request.users) > USER_BULK_MAX_ROWS:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                            detail=f"At most {USER_BULK_MAX_ROWS} users per request")
+
+    if privileged:
+        users = [user.model_dump() for user in request.users]
+        for user in users:
+            check_assignable_role(user["role"])
+    else:
+        users = [{"name": user.name, "email": user.email} for user in request.users]
+
+    results = await create_users(db, users)
+    await db.commit()
+    return FastJSONResponse({"results": results, "created": sum(result["status"] == CREATED for result in results)})
+
+@router.get("/users", status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
+async def list_users(
+    role: Optional[str] = None,
+    email_prefix: Optional[str] = None,
+    fields: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: int = Query(USER_LIST_DEFAULT_LIMIT, ge=1, le=USER_LIST_MAX_LIMIT),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List users by ascending id, optionally filtered by role and email prefix. Admins only.
+
+    `fields` is a comma-separated subset of the user fields to return. Pass the
+    `next_after` of a page as `after` to get the next one; it is null on the
+    last page. The page is streamed as it is read from the database.
+    """
+    selected = [field.strip() for field in fields.split(",")] if fields else list(USER_FIELDS)
+    unknown = [field for field in selected if field not in USER_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    # One extra row tells whether there is a next page
+    rows = iter_users(db, selected, role=role, email_prefix=email_prefix, after=after, limit=limit + 1)
+    return StreamingResponse(stream_users_page(rows, selected, limit), media_type="application/json")
+
+async def stream_users_page(rows, fields: list, limit: int):
+    count = 0
+    last_id = None
+    has_next = False
+    yield b'{"users":['
+    try:
+        async for row in rows:
+            if count == limit:
+                has_next = True
+                break
+            yield (b"," if count else b"") + orjson.dumps({field: row[field] for field in fields})
+            last_id = row["id"]
+            count += 1
+    finally:
+        await rows.aclose()
+    yield b'],"next_after":' + orjson.dumps(last_id if has_next else None) + b"}"
 
 @router.get("/user/profile", response_model=UserResponse, status_code=status.HTTP_200_OK)
 async def get_user_profile(current_user: models.User = Depends(get_current_user)):
@@ -29,26 +110,35 @@ async def get_user_profile(current_user: models.User = Depends(get_current_user)
     Fetch the current authenticated user's profile using their Cognito ID.
     """
     logger.info(f"Current user: {current_user}")
-    return current_user  # Return the user profile directly from the DB (as fetched by get_current_user)
+    return user_response(current_user)  # Return the user profile as fetched by get_current_user (session, cache or DB)
 
 @router.put("/user/profile/update", response_model=UserResponse)
 async def update_user_profile(
     profile_data: UpdateProfileSchema, 
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update the current authenticated user's profile.
     """
+    check_assignable_role(profile_data.role)
+
     # Update the current user's profile in the database
     current_user.name = profile_data.name
     current_user.email = profile_data.email
     current_user.role = profile_data.role
 
     # db.add(current_user)
-    current_user = db.merge(current_user)
-    db.commit()
-    db.refresh(current_user)
+    current_user = await db.merge(current_user)
+    # Published by the outbox relay, only if the update commits
+    add_user_event(db, USER_UPDATED, current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    await user_cache.set(current_user)
 
     logger.info(f"User profile updated: {current_user}")
-    return current_user  # Return the updated user profile
\ No newline at end of file
+    response = user_response(current_user)  # Return the updated user profile
+    # The session token carries the profile, so it is reissued with the new values
+    if session_tokens.SESSION_TOKENS_ENABLED:
+        session_tokens.set_session_cookie(response, current_user)
+    return response
\ No newline at end of file
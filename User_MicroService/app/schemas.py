@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, ConfigDict
 
 class UserBase(BaseModel):
@@ -10,4 +10,16 @@ class UserBase(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 class UserResponse(UserBase):
-    id: int
\ No newline at end of file
+    id: int
+
+class BulkUserRequest(BaseModel):
+    users: List[UserBase]
+
+class BulkUserResult(BaseModel):
+    email: str
+    cognito_id: Optional[str]
+    status: str
+
+class BulkUserResponse(BaseModel):
+    results: List[BulkUserResult]
+    created: int
@@ -1,11 +1,20 @@
-import requests
 import os
 from jose import jwt, JWTError
 from fastapi import HTTPException, status, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 import base64
+import time
 from app.database import get_db
 from app.models.models import User
+from app.services.jwks_cache import JWKSCache
+from app.services.token_cache import TokenCache
+from app.services.user_cache import user_cache
+from app.services.user_queries import get_user_row
+from app.services.http_client import request_with_retry
+from app.services.outbox import add_event, add_user_event, USER_CREATED, USER_UPDATED
+from app.services import session_tokens
+from app.metrics import JWT_VERIFY_SECONDS
 import logging
 
 
@@ -19,8 +28,19 @@ COGNITO_USERPOOL_ID = os.getenv("COGNITO_USERPOOL_ID")
 TOKEN_URL = f"https://{os.getenv('COGNITO_DOMAIN')}/oauth2/token"
 COGNITO_KEYS_URL = f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USERPOOL_ID}/.well-known/jwks.json"
 CLIENT_SECRET = os.getenv("COGNITO_APP_CLIENT_SECRET")
+# Admin rights come from sources users cannot change: Cognito groups in the access token, or this allowlist of subs
+ADMIN_GROUPS = frozenset(filter(None, (group.strip() for group in os.getenv("ADMIN_GROUPS", "admin").split(","))))
+ADMIN_COGNITO_IDS = frozenset(filter(None, (sub.strip() for sub in os.getenv("ADMIN_COGNITO_IDS", "").split(","))))
+# Roles that the API never assigns, so a stored role cannot pass for admin rights
+ADMIN_ROLES = frozenset(filter(None, (role.strip() for role in os.getenv("ADMIN_ROLES", "admin").split(","))))
 
-def exchange_code_for_tokens(code: str) -> dict:
+# Cognito public keys, kept in memory across requests
+jwks_cache = JWKSCache(COGNITO_KEYS_URL)
+
+# Verified access token payloads, shared by the HTTP dependency and the Kafka consumer
+token_cache = TokenCache()
+
+async def exchange_code_for_tokens(code: str) -> dict:
     """
     Exchange authorization code for tokens from Cognito.
     """
@@ -32,7 +52,8 @@ def exchange_code_for_tokens(code: str) -> dict:
         "Authorization": f"Basic {encoded_auth}"
     }
     
-    response = requests.post(
+    response = await request_with_retry(
+        "POST",
         TOKEN_URL,
         data={
             "grant_type": "authorization_code",
@@ -43,7 +64,7 @@ def exchange_code_for_tokens(code: str) -> dict:
         headers=headers
     )
 
-    logger.info(f"Token exchange response: {response.json()}")
+    logger.info(f"Token exchange response: {response.status_code}")
 
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail="Token exchange failed")
@@ -51,17 +72,69 @@ def exchange_code_for_tokens(code: str) -> dict:
     return response.json()
 
 def decode_jwt(token: str, access_token: str) -> dict:
-    keys = requests.get(COGNITO_KEYS_URL).json().get("keys", [])
+    """
+    Verify a token, fetching the JWKS synchronously on a miss.
 
+    Nothing in the service calls it since verification moved to
+    decode_jwt_async and the verification pool; it is kept for callers
+    outside of it.
+    """
     headers = jwt.get_unverified_headers(token)
-    kid = headers["kid"]
-    key = next((key for key in keys if key["kid"] == kid), None)
-    
+    start = time.perf_counter()
+    key = jwks_cache.get_key(headers["kid"])
+    JWT_VERIFY_SECONDS.labels("jwks").observe(time.perf_counter() - start)
+
+    return _verify_jwt(token, access_token, key)
+
+async def decode_jwt_async(token: str, access_token: str) -> dict:
+    """
+    Same as decode_jwt, but a JWKS refresh does not block the event loop.
+    """
+    headers = jwt.get_unverified_headers(token)
+    start = time.perf_counter()
+    key = await jwks_cache.aget_key(headers["kid"])
+    JWT_VERIFY_SECONDS.labels("jwks").observe(time.perf_counter() - start)
+
+    return _verify_jwt(token, access_token, key)
+
+def token_kid(token: str) -> str:
+    """
+    Return the id of the key that signed `token`, without verifying anything.
+    """
+    kid = jwt.get_unverified_headers(token).get("kid")
+    if kid is None:
+        raise JWTError("Token header has no kid")
+    return kid
+
+def decode_jwts(access_tokens: list, kid: str) -> list:
+    """
+    Verify access tokens signed by the same key, looking the key up once for all of them.
+
+    Returns `(payload, error)` pairs in input order. The error is a message,
+    not the exception: results cross a process boundary in the process pool,
+    and exceptions such as HTTPException cannot be unpickled there.
+    """
+    start = time.perf_counter()
+    key = jwks_cache.get_key(kid)
+    JWT_VERIFY_SECONDS.labels("jwks").observe(time.perf_counter() - start)
+
+    results = []
+    for access_token in access_tokens:
+        try:
+            results.append((_verify_jwt(access_token, access_token, key), None))
+        except HTTPException as e:
+            results.append((None, e.detail))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+def _verify_jwt(token: str, access_token: str, key) -> dict:
     if key is None:
         raise ValueError("Public key not found")
 
     issuer = f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USERPOOL_ID}"
 
+    start = time.perf_counter()
     try:
         payload = jwt.decode(
             token,
@@ -74,53 +147,92 @@ def decode_jwt(token: str, access_token: str) -> dict:
 
     except JWTError:
         raise HTTPException(status_code=401, detail="Token is invalid")
-    
-    logger.info(f"Token payload: {payload}")
+    finally:
+        JWT_VERIFY_SECONDS.labels("signature").observe(time.perf_counter() - start)
+
+    return payload
+
+async def validate_access_token_async(access_token: str) -> dict:
+    """
+    Verify an access token, reusing the payload of a previous verification while it is unexpired.
+    """
+    payload = token_cache.get(access_token)
+    if payload is not None:
+        return payload
 
+    payload = await decode_jwt_async(access_token, access_token)
+    token_cache.put(access_token, payload)
     return payload
 
-def get_or_create_user(user_info: dict, db: Session) -> User:
+async def get_or_create_user(user_info: dict, db: AsyncSession) -> User:
     """
     Retrieve user from the database or create a new one based on Cognito ID.
+
+    A single upsert on the email, so concurrent first logins all get the same row.
+    The login that inserted it also queues a `user.created` event.
     """
 
-    from app.main import producer
-    
-    user = db.query(User).filter(User.email == user_info["email"]).first()
-    if not user:
-        user = User(
-            cognito_id=user_info["sub"],
-            email=user_info.get("email"),
-            name=user_info.get("given_name")
+    user, created = await User.upsert(db, {
+        "cognito_id": user_info["sub"],
+        "email": user_info.get("email"),
+        "name": user_info.get("given_name")
+    })
+    if created:
+        add_user_event(db, USER_CREATED, user)
+    await db.commit()
+
+    if user.cognito_id == user_info["sub"]:
+        logger.info(f"User logged in: {user}")
+    elif user.role == "tenant":
+        # Tenants are created before they sign up; adopt their Cognito id on first login
+        old_id = user.cognito_id
+        result = await db.execute(
+            update(User)
+            .where(User.id == user.id, User.cognito_id == old_id)
+            .values(cognito_id=user_info["sub"])
         )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        logger.info(f"User created: {user}")
-    else: 
-        if user.role == "tenant":
-            old_id = user.cognito_id
-            user.cognito_id = user_info["sub"]
-            db.commit()
-            db.refresh(user)
 
+        # Only the login that performed the swap announces it, from the outbox of the same transaction
+        if result.rowcount == 1:
+            await db.refresh(user)
             message = {
                 "old_id": old_id,
                 "new_id": user.cognito_id
             }
+            add_event(db, 'user-id-update', message)
+            add_user_event(db, USER_UPDATED, user)
+            await db.commit()
 
-            producer.send('user-id-update', message)
+            await user_cache.delete(old_id)
+            await user_cache.set(user)
             logger.info(f"User ID updated: {message}")
+        else:
+            await db.commit()
+            await db.refresh(user)
 
     return user
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> User:
     """
     Extracts and verifies the JWT token from the cookie to retrieve the current user.
+
+    With session tokens enabled, a valid session_token cookie is enough: the
+    user is rebuilt from its claims, with no RSA verification and no query.
+    Otherwise, or once it expires, the Cognito access token is checked.
     """
+    session_token = request.cookies.get(session_tokens.SESSION_COOKIE) if session_tokens.SESSION_TOKENS_ENABLED else None
+    if session_token:
+        start = time.perf_counter()
+        try:
+            claims = session_tokens.verify_session_token(session_token)
+            return session_tokens.user_from_claims(claims)
+        except session_tokens.SessionTokenError as e:
+            logger.info(f"Falling back to the access token: {e}")
+        finally:
+            JWT_VERIFY_SECONDS.labels("session").observe(time.perf_counter() - start)
+
     # Retrieve the access token from cookies
     access_token = request.cookies.get("access_token")
-    logger.info(f"Access token: {access_token}")
     
     if not access_token:
         raise HTTPException(
@@ -131,7 +243,7 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
 
     try:
         # Decode the JWT token to retrieve the payload
-        payload = decode_jwt(access_token, access_token)
+        payload = await validate_access_token_async(access_token)
         cognito_id = payload.get("sub")
         if cognito_id is None:
             raise HTTPException(
@@ -140,14 +252,19 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        # Find the user in the database
-        user = db.query(User).filter(User.cognito_id == cognito_id).first()
+        # Hot users are served from the cache without touching the database
+        user = await user_cache.get_user(cognito_id)
         if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            # Only the columns, through a precompiled statement: no ORM loading for a read-only lookup
+            row = await get_user_row(db, cognito_id)
+            if row is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            await user_cache.set(row)
+            user = row.to_user()
 
         logger.info(f"Current user: {user}")
         return user
@@ -164,4 +281,41 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token validation failed",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+async def is_admin(request: Request, user: User) -> bool:
+    """
+    Whether `user` has admin rights: listed in ADMIN_COGNITO_IDS, or in one of ADMIN_GROUPS per their Cognito access token.
+
+    `users.role` is never consulted, since users choose it themselves.
+    """
+    if user.cognito_id in ADMIN_COGNITO_IDS:
+        return True
+
+    access_token = request.cookies.get("access_token")
+    if not access_token:
+        return False
+    try:
+        payload = await validate_access_token_async(access_token)
+    except (HTTPException, JWTError, ValueError) as e:
+        logger.info(f"Admin check without a valid access token: {e}")
+        return False
+    groups = payload.get("cognito:groups")
+    # The access token must be the current user's, not one left in another cookie
+    return payload.get("sub") == user.cognito_id and isinstance(groups, list) and not ADMIN_GROUPS.isdisjoint(groups)
+
+async def require_admin(request: Request, current_user: User = Depends(get_current_user)) -> User:
+    """
+    Dependency for the endpoints that expose other users' data: the current user must have admin rights.
+    """
+    if not await is_admin(request, current_user):
+        logger.info(f"Admin access denied to user {current_user.cognito_id}")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin rights required")
+    return current_user
+
+def check_assignable_role(role) -> None:
+    """
+    Reject, with a 403, a role in ADMIN_ROLES set through the API.
+    """
+    if role in ADMIN_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Role {role} cannot be assigned")
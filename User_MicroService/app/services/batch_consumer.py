@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+import logging
+from collections import namedtuple
+from aiokafka.errors import KafkaError
+from sqlalchemy.exc import OperationalError, InterfaceError
+from app.services.codecs import decode_message, EncodeError
+from app.metrics import KAFKA_BATCH_SECONDS, KAFKA_MESSAGES, record_consumer_lag, set_call_site
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_batch_consumer")
+
+KAFKA_MAX_POLL_RECORDS = int(os.getenv("KAFKA_MAX_POLL_RECORDS", "500"))
+KAFKA_POLL_TIMEOUT_MS = int(os.getenv("KAFKA_POLL_TIMEOUT_MS", "1000"))
+KAFKA_RESTART_BACKOFF = float(os.getenv("KAFKA_RESTART_BACKOFF", "1"))
+KAFKA_RESTART_BACKOFF_MAX = float(os.getenv("KAFKA_RESTART_BACKOFF_MAX", "30"))
+
+# Failures of the infrastructure rather than of a message: the batch is replayed, not skipped
+RETRYABLE_ERRORS = (OperationalError, InterfaceError, KafkaError, ConnectionError, asyncio.TimeoutError)
+
+# A message to produce once the batch is committed. `key` picks the partition,
+# `correlation_id` is echoed back in a message header and `request` is the
+# consumed message it answers. `expires_at`, a Unix time, is when the reply
+# stops being true and must no longer be replayed (e.g. a token's `exp`).
+Reply = namedtuple("Reply", ["topic", "value", "key", "correlation_id", "request", "expires_at"],
+                   defaults=(None, None, None, None))
+
+
+def correlation_id_of(message):
+    """
+    Return the request's correlation id, from the payload or from a `correlation_id` header.
+    """
+    value = message.value
+    if isinstance(value, dict) and value.get("correlation_id") is not None:
+        return str(value["correlation_id"])
+    for name, raw in getattr(message, "headers", None) or []:
+        if name == "correlation_id" and raw is not None:
+            return raw.decode("utf-8")
+    return None
+
+
+def after_commit(db, callback) -> None:
+    """
+    Await `callback()` once the batch's transaction has committed; it is dropped if the batch rolls back.
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+class BatchConsumer:
+    """
+    Drive an aiokafka consumer in micro-batches, as a supervised asyncio task.
+
+    Each `getmany()` batch is passed to `await handler(messages, db)`, which
+    returns the list of `Reply`s to send. The batch runs in one DB session and
+    one transaction; offsets are committed only after every reply has been
+    acknowledged, so a crash or a failed delivery replays the batch instead
+    of losing it. If the batch
+    fails as a whole, its messages are retried one by one and any message that
+    still fails is logged and skipped, unless the error is in `RETRYABLE_ERRORS`.
+    Likewise, a reply the codec cannot encode is logged and skipped.
+    Callbacks registered with `after_commit(db, ...)` run once the batch commits.
+
+    `run()` restarts the consumer with exponential backoff whenever it fails,
+    which rewinds it to the last committed offset. `stop()` lets the batch in
+    progress finish and commit before the consumer leaves the group.
+    """
+
+    def __init__(self, name: str, consumer_factory, producer, handler, session_factory=None,
+                 max_records: int = KAFKA_MAX_POLL_RECORDS, timeout_ms: int = KAFKA_POLL_TIMEOUT_MS):
+        self.name = name
+        self.consumer_factory = consumer_factory
+        self.producer = producer
+        self.handler = handler
+        self.session_factory = session_factory
+        self.max_records = max_records
+        self.timeout_ms = timeout_ms
+        self.consumer = None
+        self.restarts = 0
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        # Statements run by this task are reported under the consumer's name
+        set_call_site(f"kafka {self.name}")
+        backoff = KAFKA_RESTART_BACKOFF
+        while not self._stopping.is_set():
+            consumer = self.consumer_factory()
+            try:
+                await consumer.start()
+                self.consumer = consumer
+                logger.info(f"Kafka {self.name} consumer started")
+                while not self._stopping.is_set():
+                    await self.run_once()
+                    backoff = KAFKA_RESTART_BACKOFF
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.restarts += 1
+                logger.info(f"Kafka {self.name} consumer failed, restarting in {backoff}s: {e}")
+            finally:
+                self.consumer = None
+                await self._close(consumer)
+
+            if not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(backoff * 2, KAFKA_RESTART_BACKOFF_MAX)
+        logger.info(f"Kafka {self.name} consumer stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run_once(self) -> int:
+        """
+        Fetch and process a single batch. Returns the number of messages handled.
+        """
+        records = await self.consumer.getmany(timeout_ms=self.timeout_ms, max_records=self.max_records)
+        messages = [message for partition_messages in records.values() for message in partition_messages]
+        if not messages:
+            return 0
+
+        start = time.perf_counter()
+        record_consumer_lag(self.consumer, records)
+        decoded = self._decode(messages)
+        try:
+            replies = await self._handle(decoded)
+        except Exception as e:
+            logger.info(f"Kafka {self.name} batch of {len(decoded)} failed, retrying one by one: {e}")
+            replies = []
+            for message in decoded:
+                try:
+                    replies.extend(await self._handle([message]))
+                except RETRYABLE_ERRORS:
+                    raise
+                except Exception as e:
+                    logger.info(f"Skipping Kafka {self.name} message at offset {message.offset}: {e}")
+
+        deliveries = []
+        for reply in replies:
+            headers = [("correlation_id", reply.correlation_id.encode("utf-8"))] if reply.correlation_id else None
+            try:
+                deliveries.append(await self.producer.send(reply.topic, reply.value, key=reply.key, headers=headers))
+            except EncodeError as e:
+                # Replaying the batch would fail the same way forever and block the partition
+                logger.info(f"Skipping Kafka {self.name} reply to {reply.topic} that cannot be encoded: {e}")
+        await self.producer.flush()
+        # flush() does not raise for failed deliveries: a lost reply must fail the batch so it is replayed
+        await asyncio.gather(*deliveries)
+        await self.consumer.commit()
+        KAFKA_BATCH_SECONDS.labels(self.name).observe(time.perf_counter() - start)
+        KAFKA_MESSAGES.labels(self.name).inc(len(messages))
+        return len(messages)
+
+    def _decode(self, messages: list) -> list:
+        # An undecodable message can never be handled, so it is skipped like one that keeps failing
+        decoded = []
+        for message in messages:
+            try:
+                decoded.append(decode_message(message))
+            except Exception as e:
+                logger.info(f"Skipping undecodable Kafka {self.name} message at offset {message.offset}: {e}")
+        return decoded
+
+    async def _handle(self, messages: list) -> list:
+        if self.session_factory is None:
+            return await self.handler(messages, None)
+
+        async with self.session_factory() as db:
+            try:
+                replies = await self.handler(messages, db)
+                await db.commit()
+            except Exception:
+                db.info.pop("after_commit", None)
+                await db.rollback()
+                raise
+
+            for callback in db.info.pop("after_commit", []):
+                try:
+                    await callback()
+                except Exception as e:
+                    logger.info(f"Kafka {self.name} post-commit callback failed: {e}")
+            return replies
+
+    async def _close(self, consumer) -> None:
+        try:
+            await consumer.stop()
+        except Exception as e:
+            logger.info(f"Error stopping Kafka {self.name} consumer: {e}")
@@ -0,0 +1,136 @@
+import os
+import logging
+from collections import namedtuple
+import orjson
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_codecs")
+
+CONTENT_TYPE_HEADER = "content-type"
+# Codec used for topics not listed in KAFKA_TOPIC_CODECS
+KAFKA_DEFAULT_CODEC = os.getenv("KAFKA_DEFAULT_CODEC", "json")
+# "topic:codec,..." e.g. "user-events:msgpack"; both ends of a topic must support its codec
+KAFKA_TOPIC_CODECS = os.getenv("KAFKA_TOPIC_CODECS", "")
+
+# `encode` turns a value into bytes and `decode` turns those bytes back into the value
+Codec = namedtuple("Codec", ["name", "content_type", "encode", "decode"])
+
+
+def _msgpack_codec():
+    # msgspec is the faster implementation; either produces the same wire format
+    if msgspec is not None:
+        encoder, decoder = msgspec.msgpack.Encoder(), msgspec.msgpack.Decoder()
+        return Codec("msgpack", "application/msgpack", encoder.encode, decoder.decode)
+    if msgpack is not None:
+        return Codec("msgpack", "application/msgpack", msgpack.packb, msgpack.unpackb)
+    return None
+
+
+class EncodeError(ValueError):
+    pass
+
+
+def _orjson_dumps(value) -> bytes:
+    # json.dumps accepted non-str keys (e.g. numeric tenant ids) and so must this
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+JSON = Codec("json", "application/json", _orjson_dumps, orjson.loads)
+
+MSGPACK = _msgpack_codec()
+
+CODECS = {JSON.name: JSON}
+if MSGPACK is not None:
+    CODECS[MSGPACK.name] = MSGPACK
+
+
+def register_codec(codec: Codec) -> None:
+    CODECS[codec.name] = codec
+
+
+def parse_topic_codecs(value: str) -> dict:
+    """
+    Parse KAFKA_TOPIC_CODECS into a topic -> codec name mapping.
+    """
+    topics = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        topic, _, name = entry.rpartition(":")
+        if not topic or not name:
+            raise ValueError(f"Invalid KAFKA_TOPIC_CODECS entry: {entry!r}")
+        topics[topic] = name
+    return topics
+
+
+topic_codecs = parse_topic_codecs(KAFKA_TOPIC_CODECS)
+
+
+def codec_for_topic(topic: str) -> Codec:
+    name = topic_codecs.get(topic, KAFKA_DEFAULT_CODEC)
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Codec {name!r} for topic {topic} is not available; install msgspec or msgpack for msgpack")
+    return codec
+
+
+def codec_for_content_type(content_type: str):
+    for codec in CODECS.values():
+        if codec.content_type == content_type:
+            return codec
+    return None
+
+
+def encode_message(topic: str, value, headers=None) -> tuple:
+    """
+    Encode `value` with the topic's codec and name it in a content-type header.
+
+    Returns the encoded value and the headers to send with it. Raises
+    EncodeError when the codec cannot represent the value.
+    """
+    codec = codec_for_topic(topic)
+    try:
+        encoded = codec.encode(value)
+    except Exception as e:
+        raise EncodeError(f"Cannot encode message for {topic} as {codec.name}: {e}") from e
+    headers = list(headers or [])
+    headers.append((CONTENT_TYPE_HEADER, codec.content_type.encode("utf-8")))
+    return encoded, headers
+
+
+def decode_message(message):
+    """
+    Replace a consumed message's raw value with the decoded one and return the message.
+
+    The producer's content-type header picks the codec; messages without
+    one (e.g. from older producers) use the topic's codec.
+    """
+    if not isinstance(message.value, (bytes, bytearray)):
+        return message
+
+    codec = None
+    for name, raw in getattr(message, "headers", None) or []:
+        if name == CONTENT_TYPE_HEADER and raw is not None:
+            codec = codec_for_content_type(raw.decode("utf-8"))
+            break
+    codec = codec or codec_for_topic(message.topic)
+    message.value = codec.decode(message.value)
+    return message
+
+
+def check_topic_codecs() -> None:
+    """
+    Fail at startup, rather than on the first message, if a configured codec is not installed.
+    """
+    for topic in topic_codecs:
+        codec_for_topic(topic)
+    codec_for_topic(None)
@@ -0,0 +1,94 @@
+import os
+import random
+import asyncio
+import logging
+import httpx
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_http_client")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.2"))
+
+# Errors raised before the request reached the server, safe to retry for any method
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Errors and statuses that are only safe to retry for idempotent requests
+READ_ERRORS = (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError)
+RETRY_STATUSES = {429, 502, 503, 504}
+
+_client = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http1=True,
+        http2=False,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def startup() -> None:
+    global _client
+    if _client is None:
+        _client = create_http_client()
+        logger.info("HTTP client started")
+
+
+async def shutdown() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("HTTP client closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, creating it on first use outside of the app lifespan.
+    """
+    global _client
+    if _client is None:
+        _client = create_http_client()
+    return _client
+
+
+async def request_with_retry(method: str, url: str, idempotent: bool = None, **kwargs) -> httpx.Response:
+    """
+    Send a request on the shared client, retrying transient failures with exponential backoff.
+
+    Non-idempotent requests (POST by default) are only retried when the
+    connection could not be established, so they are never sent twice.
+    """
+    if idempotent is None:
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS")
+
+    client = get_http_client()
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+            if not (idempotent and response.status_code in RETRY_STATUSES and attempt < HTTP_RETRIES):
+                return response
+            logger.info(f"{method} {url} returned {response.status_code}, retrying")
+        except CONNECT_ERRORS as e:
+            if attempt >= HTTP_RETRIES:
+                raise
+            logger.info(f"{method} {url} failed to connect: {e!r}, retrying")
+        except READ_ERRORS as e:
+            if not idempotent or attempt >= HTTP_RETRIES:
+                raise
+            logger.info(f"{method} {url} failed: {e!r}, retrying")
+
+        await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+        attempt += 1
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete
+from app.models.models import ProcessedRequest
+from app.services.batch_consumer import Reply, correlation_id_of, after_commit
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_idempotency")
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "300"))
+
+
+def request_key(message) -> str:
+    """
+    Identify a request by its topic and `request_id` or correlation id, or by a hash of its content when it has neither.
+    """
+    value = message.value
+    request_id = value.get("request_id") if isinstance(value, dict) else None
+    request_id = request_id or correlation_id_of(message)
+    if request_id is not None:
+        identity = f"id:{request_id}"
+    else:
+        identity = "content:" + json.dumps(value, sort_keys=True, default=str)
+    topic = getattr(message, "topic", "")
+    return hashlib.sha256(f"{topic}\0{identity}".encode("utf-8")).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class IdempotencyStore:
+    """
+    Replies of the requests already handled, for `ttl` seconds.
+
+    An in-process LRU answers most redeliveries; with `persistent`, records
+    are also written to `processed_requests` in the batch's transaction, so
+    they survive restarts and are shared by replicas. Without a session
+    (consumers that do not write to the database) only the LRU is used.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+                 persistent: bool = True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def lookup(self, db, keys) -> dict:
+        """
+        Return the recorded replies, as lists of `[topic, value, key, correlation_id]`, of the known `keys`.
+        """
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+
+        missing = [key for key in keys if key not in found]
+        if missing and db is not None and self.persistent:
+            await self._purge_expired(db)
+            rows = await db.execute(
+                select(ProcessedRequest.request_key, ProcessedRequest.replies)
+                .where(ProcessedRequest.request_key.in_(missing), ProcessedRequest.expires_at > _utcnow())
+            )
+            for key, replies in rows:
+                found[key] = replies
+                self._remember(key, replies)
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def record(self, db, key: str, replies: list, expires_at: float = None) -> None:
+        """
+        Record the replies of a handled request; with a session, once its transaction commits.
+
+        `expires_at` (a Unix time) shortens the record's life below `ttl`; replies already past it are not recorded.
+        """
+        ttl = self.ttl if expires_at is None else min(self.ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        if db is None or not self.persistent:
+            self._remember(key, replies, ttl)
+            return
+
+        db.add(ProcessedRequest(request_key=key, replies=replies, expires_at=_utcnow() + timedelta(seconds=ttl)))
+
+        async def remember():
+            self._remember(key, replies, ttl)
+
+        after_commit(db, remember)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, key: str, replies: list, ttl: float = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), replies)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _purge_expired(self, db) -> None:
+        if time.monotonic() - self._last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        await db.execute(delete(ProcessedRequest).where(ProcessedRequest.expires_at <= _utcnow()))
+
+
+def idempotent(handler, store: IdempotencyStore):
+    """
+    Wrap a batch handler so that requests already handled get their recorded replies instead of being handled again.
+
+    Repeats of a request within the batch are handled once. The handler must
+    set `request` on its replies; requests that produced no reply are not
+    recorded and are handled again when redelivered. A request is recorded
+    no longer than the earliest `expires_at` of its replies.
+    """
+
+    async def handle(messages, db):
+        keys = [request_key(message) for message in messages]
+        recorded = await store.lookup(db, list(dict.fromkeys(keys)))
+
+        first = {}
+        for key, message in zip(keys, messages):
+            if key not in recorded:
+                first.setdefault(key, message)
+        if first:
+            key_of = {id(message): key for key, message in first.items()}
+            handled = {}
+            expiries = {}
+            for reply in await handler(list(first.values()), db):
+                key = key_of[id(reply.request)]
+                handled.setdefault(key, []).append(list(reply[:4]))
+                if reply.expires_at is not None:
+                    expiries[key] = min(reply.expires_at, expiries.get(key, reply.expires_at))
+            for key, replies in handled.items():
+                store.record(db, key, replies, expiries.get(key))
+                recorded[key] = replies
+
+        if len(messages) > len(first):
+            logger.info(f"Answering {len(messages) - len(first)} repeated requests from the idempotency store")
+        return [Reply(*reply, request=message) for key, message in zip(keys, messages) for reply in recorded.get(key, [])]
+
+    return handle
@@ -0,0 +1,176 @@
+import os
+import asyncio
+import threading
+import time
+import logging
+import requests
+from jose import jwk
+from jose.exceptions import JWKError
+from app.services.http_client import request_with_retry
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_jwks_cache")
+
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+JWKS_FETCH_TIMEOUT = float(os.getenv("JWKS_FETCH_TIMEOUT", "5"))
+
+
+class JWKSCache:
+    """
+    In-process store of the Cognito signing keys, parsed once and indexed by kid.
+
+    Keys older than `ttl` are still served while a background thread (or task,
+    from async callers) refreshes them. An unknown kid triggers a refresh, rate
+    limited by `min_refresh_interval`, and concurrent callers share a single fetch.
+    A failed refresh, including an error status or a document without keys,
+    keeps the previous keys.
+    """
+
+    def __init__(self, url: str, ttl: float = JWKS_CACHE_TTL,
+                 min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+                 timeout: float = JWKS_FETCH_TIMEOUT):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._async_inflight = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get_key(self, kid: str):
+        """
+        Return the parsed public key for `kid`, or None if Cognito does not publish it.
+        """
+        key = self._keys.get(kid)
+        if key is not None:
+            self.hits += 1
+            if self._is_stale():
+                self._refresh_in_background()
+            return key
+
+        self.misses += 1
+        if self._fetched_at is None or self._age() >= self.min_refresh_interval:
+            self.refresh()
+        return self._keys.get(kid)
+
+    async def aget_key(self, kid: str):
+        """
+        Async variant of `get_key` that fetches through the shared HTTP client.
+        """
+        key = self._keys.get(kid)
+        if key is not None:
+            self.hits += 1
+            if self._is_stale() and not self._async_refresh_running():
+                self._async_inflight = asyncio.ensure_future(self._arefresh())
+            return key
+
+        self.misses += 1
+        if self._fetched_at is None or self._age() >= self.min_refresh_interval:
+            await self.arefresh()
+        return self._keys.get(kid)
+
+    def refresh(self) -> None:
+        """
+        Fetch the JWKS document and swap in the new key set.
+
+        Only one fetch runs at a time; callers arriving while it is in flight
+        wait for it instead of issuing their own request.
+        """
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                inflight = self._inflight = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            inflight.wait(self.timeout)
+            return
+
+        try:
+            self._store(self._fetch())
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.info(f"Error refreshing JWKS: {e}")
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.set()
+
+    async def arefresh(self) -> None:
+        if not self._async_refresh_running():
+            self._async_inflight = asyncio.ensure_future(self._arefresh())
+        await asyncio.shield(self._async_inflight)
+
+    def clear(self) -> None:
+        self._keys = {}
+        self._fetched_at = None
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "age_seconds": self._age() if self._fetched_at is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+    def _fetch(self) -> dict:
+        return self._keys_from(requests.get(self.url, timeout=self.timeout))
+
+    async def _arefresh(self) -> None:
+        try:
+            self._store(self._keys_from(await request_with_retry("GET", self.url, timeout=self.timeout)))
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.info(f"Error refreshing JWKS: {e}")
+
+    def _store(self, keys: dict) -> None:
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        self.refreshes += 1
+        logger.info(f"JWKS refreshed: {len(keys)} keys")
+
+    def _keys_from(self, response) -> dict:
+        # An error answer must not replace the keys in use with an empty set
+        if response.status_code != 200:
+            raise ValueError(f"JWKS endpoint returned {response.status_code}")
+        keys = self._parse(response.json().get("keys") or [])
+        if not keys:
+            raise ValueError("JWKS response has no usable keys")
+        return keys
+
+    def _parse(self, jwks: list) -> dict:
+        keys = {}
+        for key_data in jwks:
+            try:
+                keys[key_data["kid"]] = jwk.construct(key_data, algorithm=key_data.get("alg", "RS256"))
+            except (KeyError, JWKError) as e:
+                logger.info(f"Skipping unusable JWKS entry: {e}")
+        return keys
+
+    def _age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    def _is_stale(self) -> bool:
+        return self._fetched_at is not None and self._age() >= self.ttl
+
+    def _async_refresh_running(self) -> bool:
+        return self._async_inflight is not None and not self._async_inflight.done()
+
+    def _refresh_in_background(self) -> None:
+        if self._inflight is not None:
+            return
+        threading.Thread(target=self.refresh, daemon=True).start()
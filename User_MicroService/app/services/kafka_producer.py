@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+from functools import partial
+from aiokafka import AIOKafkaProducer
+from app.metrics import KAFKA_SEND_SECONDS
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_kafka_producer")
+
+KAFKA_PRODUCER_LINGER_MS = int(os.getenv("KAFKA_PRODUCER_LINGER_MS", "5"))
+KAFKA_PRODUCER_BATCH_SIZE = int(os.getenv("KAFKA_PRODUCER_BATCH_SIZE", "65536"))
+# gzip needs no extra library; lz4, snappy and zstd need their python packages installed
+KAFKA_PRODUCER_COMPRESSION = os.getenv("KAFKA_PRODUCER_COMPRESSION", "gzip") or None
+KAFKA_PRODUCER_ACKS = os.getenv("KAFKA_PRODUCER_ACKS", "all")
+
+
+def producer_config() -> dict:
+    acks = KAFKA_PRODUCER_ACKS if KAFKA_PRODUCER_ACKS == "all" else int(KAFKA_PRODUCER_ACKS)
+    return {
+        "linger_ms": KAFKA_PRODUCER_LINGER_MS,
+        "max_batch_size": KAFKA_PRODUCER_BATCH_SIZE,
+        "compression_type": KAFKA_PRODUCER_COMPRESSION,
+        "acks": acks,
+    }
+
+
+class ReplyProducer:
+    """
+    AIOKafkaProducer wrapper that tracks every send until the broker acknowledges it.
+
+    Counts delivered and failed messages per topic, the number of messages
+    still waiting for an acknowledgement, and the send-to-ack latency. The
+    underlying producer needs a running event loop, so it is only created by
+    `start()`. An `encoder(topic, value, headers)` returning the encoded value
+    and headers lets the value format depend on the topic.
+    """
+
+    def __init__(self, producer_factory=None, encoder=None, **config):
+        self._producer_factory = producer_factory or partial(AIOKafkaProducer, **{**producer_config(), **config})
+        self._encoder = encoder
+        self._producer = None
+        self.sent = 0
+        self.delivered = 0
+        self.errors = 0
+        self.pending = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.errors_by_topic = {}
+
+    @property
+    def started(self) -> bool:
+        return self._producer is not None
+
+    async def start(self) -> None:
+        producer = self._producer_factory()
+        try:
+            await producer.start()
+        except Exception:
+            await producer.stop()
+            raise
+        self._producer = producer
+        logger.info("Kafka producer started")
+
+    async def send(self, topic: str, value, key=None, headers=None):
+        """
+        Queue a message and return the future of its delivery.
+        """
+        if self._producer is None:
+            raise RuntimeError("Kafka producer is not started")
+
+        if self._encoder is not None:
+            value, headers = self._encoder(topic, value, headers)
+
+        self.sent += 1
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            future = await self._producer.send(topic, value, key=key, headers=headers)
+        except Exception as e:
+            self._on_error(topic, start, e)
+            raise
+        future.add_done_callback(partial(self._on_delivery, topic, start))
+        return future
+
+    async def flush(self) -> None:
+        if self._producer is not None:
+            await self._producer.flush()
+
+    async def close(self) -> None:
+        """
+        Deliver outstanding messages and stop the underlying producer.
+        """
+        if self._producer is None:
+            return
+        producer, self._producer = self._producer, None
+        try:
+            await producer.flush()
+        finally:
+            await producer.stop()
+        logger.info(f"Kafka producer closed: {self.stats()}")
+
+    def stats(self) -> dict:
+        acknowledged = self.delivered + self.errors
+        return {
+            "started": self.started,
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "errors": self.errors,
+            "pending": self.pending,
+            "latency_avg_ms": 1000 * self.latency_total / acknowledged if acknowledged else 0.0,
+            "latency_max_ms": 1000 * self.latency_max,
+            "errors_by_topic": dict(self.errors_by_topic),
+        }
+
+    def _record(self, topic: str, start: float) -> None:
+        latency = time.perf_counter() - start
+        KAFKA_SEND_SECONDS.labels(topic).observe(latency)
+        self.pending -= 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def _on_delivery(self, topic: str, start: float, future) -> None:
+        if future.cancelled():
+            self._on_error(topic, start, "cancelled")
+        elif future.exception() is not None:
+            self._on_error(topic, start, future.exception())
+        else:
+            self._record(topic, start)
+            self.delivered += 1
+
+    def _on_error(self, topic: str, start: float, exception) -> None:
+        self._record(topic, start)
+        self.errors += 1
+        self.errors_by_topic[topic] = self.errors_by_topic.get(topic, 0) + 1
+        logger.info(f"Failed to deliver Kafka message to {topic}: {exception}")
@@ -0,0 +1,124 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from app.models.models import OutboxEvent
+from app.metrics import set_call_site
+from app.services.user_cache import user_to_dict
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_outbox")
+
+USER_EVENTS_TOPIC = os.getenv("USER_EVENTS_TOPIC", "user-events")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_RETRY_BACKOFF_MAX = float(os.getenv("OUTBOX_RETRY_BACKOFF_MAX", "30"))
+
+USER_CREATED = "user.created"
+USER_UPDATED = "user.updated"
+
+
+def add_event(db, topic: str, payload: dict, key: str = None) -> None:
+    """
+    Queue a Kafka message in the caller's transaction: it is published only if the transaction commits.
+    """
+    db.add(OutboxEvent(topic=topic, key=key, payload=payload))
+
+
+def add_user_event(db, event_type: str, user) -> None:
+    """
+    Queue a `user-events` message carrying the user's full record, keyed by cognito_id.
+    """
+    record = user if isinstance(user, dict) else user_to_dict(user)
+    payload = {
+        "type": event_type,
+        "user": record,
+        "occurred_at": datetime.now(timezone.utc).isoformat(),
+    }
+    add_event(db, USER_EVENTS_TOPIC, payload, key=record["cognito_id"])
+
+
+class OutboxRelay:
+    """
+    Publish the outbox to Kafka in batches, as a supervised asyncio task.
+
+    A batch is locked with `FOR UPDATE SKIP LOCKED`, so replicas relay
+    disjoint batches, and its rows are deleted only once the broker has
+    acknowledged every message: delivery is at least once, and a crash
+    between the two replays the batch. Events of one user share a key and
+    therefore a partition, and are sent in the order they were written.
+    """
+
+    def __init__(self, producer, session_factory, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.producer = producer
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.published = 0
+        self.batches = 0
+        self.errors = 0
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        set_call_site("kafka outbox")
+        backoff = self.poll_interval
+        while not self._stopping.is_set():
+            try:
+                relayed = await self.relay_once()
+                backoff = self.poll_interval
+                if relayed == self.batch_size:
+                    # More is waiting, drain it without sleeping
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.info(f"Outbox relay failed, retrying in {backoff}s: {e}")
+                backoff = min(backoff * 2, OUTBOX_RETRY_BACKOFF_MAX)
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+        logger.info("Outbox relay stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def relay_once(self) -> int:
+        """
+        Publish one batch and delete it from the outbox. Returns the number of events published.
+        """
+        async with self.session_factory() as db:
+            events = (await db.execute(
+                select(OutboxEvent)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not events:
+                return 0
+
+            try:
+                deliveries = [await self.producer.send(event.topic, event.payload, key=event.key) for event in events]
+                await asyncio.gather(*deliveries)
+            except Exception:
+                await db.rollback()
+                raise
+
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events])))
+            await db.commit()
+
+        self.published += len(events)
+        self.batches += 1
+        return len(events)
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
@@ -0,0 +1,194 @@
+import os
+import time
+import json
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+import logging
+from app.services.user_cache import USER_FIELDS, user_to_dict, user_from_dict
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_session_tokens")
+
+# When enabled, /callback also sets a session_token cookie that get_current_user checks before the Cognito token
+SESSION_TOKENS_ENABLED = os.getenv("SESSION_TOKENS_ENABLED", "false").lower() in ("1", "true", "yes")
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "900"))
+SESSION_KEY_ROTATION_INTERVAL = float(os.getenv("SESSION_KEY_ROTATION_INTERVAL", "3600"))
+# "kid:base64-secret,..." shared by every replica, newest first; without it each process generates its own keys
+SESSION_SIGNING_KEYS = os.getenv("SESSION_SIGNING_KEYS", "")
+SESSION_TOKEN_ISSUER = "user-service"
+SESSION_COOKIE = "session_token"
+
+
+class SessionTokenError(ValueError):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def parse_signing_keys(value: str) -> list:
+    """
+    Parse SESSION_SIGNING_KEYS into `(kid, secret)` pairs, in the order given.
+    """
+    keys = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        kid, _, secret = entry.partition(":")
+        if not kid or not secret:
+            raise ValueError(f"Invalid SESSION_SIGNING_KEYS entry for kid {kid!r}")
+        keys.append((kid, _b64decode(secret)))
+    return keys
+
+
+class SessionKeyring:
+    """
+    HMAC-SHA256 keys for session tokens: one active signing key plus the retired keys still accepted.
+
+    Generated keys are rotated every `rotation_interval`. A retired key keeps
+    verifying for `overlap` seconds, at least a token lifetime, so rotation
+    never rejects a token that has not expired yet. Configured keys (shared
+    between replicas) are never rotated here: the first one signs, the others
+    verify, and rotation means redeploying with a new key in front.
+    """
+
+    def __init__(self, keys: list = None, rotation_interval: float = SESSION_KEY_ROTATION_INTERVAL,
+                 overlap: float = SESSION_TOKEN_TTL):
+        self.rotation_interval = rotation_interval
+        self.overlap = overlap
+        self.rotating = not keys
+        self._lock = threading.Lock()
+        # kid -> (secret, retires_at); None while the key is still allowed to sign
+        self._keys = {}
+        self.active_kid = None
+        self._activated_at = None
+        if keys:
+            self.active_kid = keys[0][0]
+            self._activated_at = time.monotonic()
+            for kid, secret in keys:
+                self._keys[kid] = (secret, None)
+        else:
+            self.rotate()
+
+    def rotate(self) -> str:
+        """
+        Start signing with a new random key; the previous one keeps verifying for `overlap` seconds.
+        """
+        kid = secrets.token_hex(8)
+        now = time.monotonic()
+        with self._lock:
+            if self.active_kid is not None:
+                secret, _ = self._keys[self.active_kid]
+                self._keys[self.active_kid] = (secret, now + self.overlap)
+            self._keys = {k: v for k, v in self._keys.items() if v[1] is None or v[1] > now}
+            self._keys[kid] = (secrets.token_bytes(32), None)
+            self.active_kid = kid
+            self._activated_at = now
+        logger.info(f"Session signing key rotated: {kid}")
+        return kid
+
+    def signing_key(self) -> tuple:
+        if self.rotating and time.monotonic() - self._activated_at >= self.rotation_interval:
+            self.rotate()
+        kid = self.active_kid
+        return kid, self._keys[kid][0]
+
+    def verification_key(self, kid: str):
+        entry = self._keys.get(kid)
+        if entry is None:
+            return None
+        secret, retires_at = entry
+        if retires_at is not None and retires_at <= time.monotonic():
+            return None
+        return secret
+
+    def stats(self) -> dict:
+        return {
+            "active_kid": self.active_kid,
+            "keys": len(self._keys),
+            "rotating": self.rotating,
+            "active_age_seconds": time.monotonic() - self._activated_at,
+        }
+
+
+def _sign(secret: bytes, signing_input: bytes) -> bytes:
+    return hmac.new(secret, signing_input, hashlib.sha256).digest()
+
+
+def issue_session_token(user, keyring: SessionKeyring = None, ttl: int = SESSION_TOKEN_TTL) -> str:
+    """
+    Mint an HS256 JWT carrying the user's record, so requests can be authenticated without the database.
+    """
+    keyring = keyring or session_keyring
+    kid, secret = keyring.signing_key()
+    now = int(time.time())
+    claims = {**user_to_dict(user), "sub": user.cognito_id, "iss": SESSION_TOKEN_ISSUER, "iat": now, "exp": now + ttl}
+    header = {"alg": "HS256", "typ": "JWT", "kid": kid}
+
+    signing_input = ".".join(
+        _b64encode(json.dumps(part, separators=(",", ":")).encode()) for part in (header, claims)
+    ).encode()
+    return f"{signing_input.decode()}.{_b64encode(_sign(secret, signing_input))}"
+
+
+def verify_session_token(token: str, keyring: SessionKeyring = None) -> dict:
+    """
+    Check the MAC and expiry of a session token and return its claims.
+
+    Raises SessionTokenError for anything not issued by this service, signed
+    by a retired key, or expired.
+    """
+    keyring = keyring or session_keyring
+    try:
+        encoded_header, encoded_claims, encoded_signature = token.split(".")
+        header = json.loads(_b64decode(encoded_header))
+        signature = _b64decode(encoded_signature)
+    except (ValueError, AttributeError):
+        raise SessionTokenError("Malformed session token")
+
+    if not isinstance(header, dict) or header.get("alg") != "HS256":
+        raise SessionTokenError("Unexpected session token algorithm")
+    # Read before the signature is checked, so anything may be in it
+    if not isinstance(header.get("kid"), str):
+        raise SessionTokenError("Malformed session token")
+    secret = keyring.verification_key(header["kid"])
+    if secret is None:
+        raise SessionTokenError("Unknown session signing key")
+
+    signing_input = f"{encoded_header}.{encoded_claims}".encode()
+    if not hmac.compare_digest(signature, _sign(secret, signing_input)):
+        raise SessionTokenError("Invalid session token signature")
+
+    try:
+        claims = json.loads(_b64decode(encoded_claims))
+    except ValueError:
+        raise SessionTokenError("Malformed session token")
+    if not isinstance(claims, dict):
+        raise SessionTokenError("Malformed session token")
+    if claims.get("iss") != SESSION_TOKEN_ISSUER:
+        raise SessionTokenError("Unexpected session token issuer")
+    if not isinstance(claims.get("exp"), (int, float)) or claims["exp"] <= time.time():
+        raise SessionTokenError("Session token expired")
+    return claims
+
+
+def set_session_cookie(response, user) -> None:
+    response.set_cookie(key=SESSION_COOKIE, value=issue_session_token(user), httponly=True,
+                        max_age=SESSION_TOKEN_TTL, secure=True, samesite="strict")
+
+
+def user_from_claims(claims: dict):
+    """
+    Rebuild the detached User a session token describes.
+    """
+    return user_from_dict({field: claims.get(field) for field in USER_FIELDS})
+
+
+session_keyring = SessionKeyring(parse_signing_keys(SESSION_SIGNING_KEYS))
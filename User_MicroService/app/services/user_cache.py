@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from sqlalchemy.orm import make_transient_to_detached
+from app.models.models import User
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_user_cache")
+
+# "memory" keeps records in this process; "none" turns the cache off
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+USER_FIELDS = ("id", "cognito_id", "name", "email", "role")
+
+
+def user_to_dict(user) -> dict:
+    return {field: getattr(user, field) for field in USER_FIELDS}
+
+
+def user_from_dict(data: dict) -> User:
+    """
+    Rebuild a detached User from a cached record, so it can be merged into a session like a loaded row.
+    """
+    user = User(**data)
+    make_transient_to_detached(user)
+    return user
+
+
+class UserCache:
+    """
+    Interface of the user record cache, keyed by cognito_id.
+
+    Records are plain dicts of `USER_FIELDS`, so a backend only has to store
+    serializable values. Every method is async so that a networked backend
+    (e.g. Redis) can implement it without blocking the event loop. This base
+    class caches nothing.
+    """
+
+    async def get(self, cognito_id: str):
+        return None
+
+    async def get_many(self, cognito_ids: list) -> dict:
+        """
+        Return the cached records among `cognito_ids`; misses are left out.
+        """
+        records = {}
+        for cognito_id in cognito_ids:
+            record = await self.get(cognito_id)
+            if record is not None:
+                records[cognito_id] = record
+        return records
+
+    async def set(self, user) -> None:
+        pass
+
+    async def set_many(self, users: list) -> None:
+        for user in users:
+            await self.set(user)
+
+    async def delete(self, *cognito_ids) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+    async def get_user(self, cognito_id: str):
+        """
+        Return the cached user as a detached User, or None on a miss.
+        """
+        record = await self.get(cognito_id)
+        return user_from_dict(record) if record is not None else None
+
+
+class MemoryUserCache(UserCache):
+    """
+    In-process LRU of user records, each served for at most `ttl` seconds.
+
+    Writes made by this process update or drop the entry straight away; the
+    TTL bounds how long a change made by another replica can go unnoticed.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, cognito_id: str):
+        with self._lock:
+            entry = self._entries.get(cognito_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, record = entry
+            if expires_at <= time.monotonic():
+                del self._entries[cognito_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(cognito_id)
+            self.hits += 1
+            return dict(record)
+
+    async def set(self, user) -> None:
+        record = user if isinstance(user, dict) else user_to_dict(user)
+        if record.get("cognito_id") is None:
+            return
+
+        with self._lock:
+            self._entries[record["cognito_id"]] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(record["cognito_id"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def delete(self, *cognito_ids) -> None:
+        with self._lock:
+            for cognito_id in cognito_ids:
+                self._entries.pop(cognito_id, None)
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def create_user_cache(backend: str = USER_CACHE_BACKEND) -> UserCache:
+    if backend == "memory":
+        return MemoryUserCache()
+    if backend == "none":
+        return UserCache()
+    raise ValueError(f"Unknown USER_CACHE_BACKEND: {backend}")
+
+
+# Shared by the HTTP handlers and the Kafka consumers
+user_cache = create_user_cache()
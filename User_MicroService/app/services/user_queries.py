@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import bindparam, select, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User
+from app.services.user_cache import USER_FIELDS, user_from_dict
+
+
+@dataclass(slots=True, frozen=True)
+class UserRow:
+    """
+    A user's columns as read, without ORM state: nothing is tracked, flushed or added to the identity map.
+
+    It has the attributes of a User, so it can be cached or put in a session
+    token as is; `to_user()` gives the detached User that routes expect.
+    """
+
+    id: int
+    cognito_id: str
+    name: str
+    email: str
+    role: Optional[str]
+
+    def to_user(self) -> User:
+        return user_from_dict({field: getattr(self, field) for field in USER_FIELDS})
+
+
+# Built once at import with bind parameters, so each call only binds values:
+# the compiled form comes from the engine's statement cache. They run on the
+# session's connection, which skips the ORM execution layer entirely.
+USER_COLUMNS = (User.id, User.cognito_id, User.name, User.email, User.role)
+USER_BY_COGNITO_ID = select(*USER_COLUMNS).where(User.cognito_id == bindparam("cognito_id"))
+USERS_BY_COGNITO_IDS = select(*USER_COLUMNS).where(User.cognito_id.in_(bindparam("cognito_ids", expanding=True)))
+# EXISTS stops at the first match and returns no columns
+EMAIL_EXISTS = select(exists().where(User.email == bindparam("email")))
+
+
+async def get_user_row(db: AsyncSession, cognito_id: str) -> Optional[UserRow]:
+    connection = await db.connection()
+    row = (await connection.execute(USER_BY_COGNITO_ID, {"cognito_id": cognito_id})).first()
+    return UserRow(*row) if row is not None else None
+
+
+async def get_user_rows(db: AsyncSession, cognito_ids: list) -> list:
+    """
+    Return the UserRows among `cognito_ids`, in no particular order; unknown ids are left out.
+    """
+    if not cognito_ids:
+        return []
+    connection = await db.connection()
+    return [UserRow(*row) for row in await connection.execute(USERS_BY_COGNITO_IDS, {"cognito_ids": list(cognito_ids)})]
+
+
+async def email_exists(db: AsyncSession, email: str) -> bool:
+    connection = await db.connection()
+    return bool(await connection.scalar(EMAIL_EXISTS, {"email": email}))
@@ -0,0 +1,195 @@
+import os
+import uuid
+from datetime import timedelta
+import logging
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User
+from app.services.user_cache import user_cache, USER_FIELDS
+from app.services.user_queries import get_user_rows
+from app.services.outbox import add_user_event, USER_CREATED, USER_UPDATED
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_user_service")
+
+TENANT_LOOKUP_CHUNK_SIZE = int(os.getenv("TENANT_LOOKUP_CHUNK_SIZE", "500"))
+USER_BULK_CHUNK_SIZE = int(os.getenv("USER_BULK_CHUNK_SIZE", "500"))
+USER_BULK_MAX_ROWS = int(os.getenv("USER_BULK_MAX_ROWS", "5000"))
+USER_LIST_DEFAULT_LIMIT = int(os.getenv("USER_LIST_DEFAULT_LIMIT", "100"))
+USER_LIST_MAX_LIMIT = int(os.getenv("USER_LIST_MAX_LIMIT", "1000"))
+USER_EXPORT_BATCH_SIZE = int(os.getenv("USER_EXPORT_BATCH_SIZE", "1000"))
+# How far the export watermark trails the database clock; must exceed the longest transaction writing users
+USER_EXPORT_SAFETY_LAG = float(os.getenv("USER_EXPORT_SAFETY_LAG", "60"))
+
+EXPORT_FIELDS = USER_FIELDS + ("updated_at",)
+
+CREATED = "created"
+EXISTING = "existing"
+CONFLICT = "conflict"
+
+async def get_tenants_data(db: AsyncSession, tenant_ids: list, chunk_size: int = TENANT_LOOKUP_CHUNK_SIZE) -> dict:
+    """
+    Map each tenant cognito_id to [name, email].
+
+    Cached users are answered from the user cache; the others are loaded with
+    chunked IN queries and cached. Ids with no matching user are kept in the
+    result with a None value. Ids are cognito_ids, so they are looked up and
+    returned as strings: a numeric id gets the entry of its string form.
+    """
+    tenant_data = dict.fromkeys(str(tenant_id) for tenant_id in tenant_ids or [])
+    for cognito_id, record in (await user_cache.get_many(list(tenant_data))).items():
+        tenant_data[cognito_id] = [record["name"], record["email"]]
+    unique_ids = [tenant_id for tenant_id, data in tenant_data.items() if data is None]
+
+    for start in range(0, len(unique_ids), chunk_size):
+        rows = await get_user_rows(db, unique_ids[start:start + chunk_size])
+        await user_cache.set_many(rows)
+        for row in rows:
+            tenant_data[row.cognito_id] = [row.name, row.email]
+
+    missing = [tenant_id for tenant_id, data in tenant_data.items() if data is None]
+    if missing:
+        logger.info(f"Tenants not found: {missing}")
+
+    return tenant_data
+
+async def create_users(db: AsyncSession, users: list, role: str = None, chunk_size: int = USER_BULK_CHUNK_SIZE) -> list:
+    """
+    Insert `users` (dicts with name, email and optionally cognito_id and role) with one upsert per chunk.
+
+    Returns one `{"email", "cognito_id", "status"}` per input user, in input
+    order. Status is "created", "existing" (the email was already registered)
+    or "conflict" (the cognito_id belongs to another email, nothing stored).
+    Users without a cognito_id get a generated one. When `role` is given
+    every user gets it, existing ones included. Created and changed users
+    get a `user-events` outbox entry. The caller commits.
+
+    Each chunk costs a lookup of the emails and cognito_ids already
+    registered, the upsert, and a read-back of the new emails: a user
+    inserted concurrently by another request is then reported as existing,
+    with its real cognito_id.
+    """
+    rows = {}
+    for user in users:
+        # The first occurrence of a repeated email wins
+        if user["email"] not in rows:
+            rows[user["email"]] = {
+                "cognito_id": user.get("cognito_id") or str(uuid.uuid4()),
+                "name": user.get("name"),
+                "email": user["email"],
+                "role": role if role is not None else user.get("role"),
+            }
+    unique_rows = list(rows.values())
+
+    dialect_name = db.get_bind().dialect.name
+    columns = [getattr(User, field) for field in USER_FIELDS]
+    results = {}
+    for start in range(0, len(unique_rows), chunk_size):
+        chunk = unique_rows[start:start + chunk_size]
+        emails = [row["email"] for row in chunk]
+        found = [dict(record) for record in (await db.execute(
+            select(*columns).where(or_(User.email.in_(emails), User.cognito_id.in_([row["cognito_id"] for row in chunk])))
+        )).mappings()]
+        existing = {record["email"]: record for record in found if record["email"] in set(emails)}
+        taken = {record["cognito_id"]: record["email"] for record in found}
+
+        # A row must only collide on its email: one whose cognito_id is another
+        # user's would update that user on MySQL and fail on SQLite
+        conflicts = set()
+        for row in chunk:
+            if row["email"] in existing:
+                # Kept by the upsert anyway
+                row["cognito_id"] = existing[row["email"]]["cognito_id"]
+            elif taken.setdefault(row["cognito_id"], row["email"]) != row["email"]:
+                conflicts.add(row["email"])
+
+        upserted = [row for row in chunk if row["email"] not in conflicts]
+        if upserted:
+            await db.execute(User.upsert_statement(dialect_name, upserted, update=("role",) if role is not None else ()))
+
+        new_emails = [email for email in emails if email not in existing and email not in conflicts]
+        stored = {record["email"]: dict(record) for record in (await db.execute(
+            select(*columns).where(User.email.in_(new_emails))
+        )).mappings()} if new_emails else {}
+
+        for row in chunk:
+            email = row["email"]
+            if email in existing:
+                record = existing[email]
+                results[email] = {"email": email, "cognito_id": record["cognito_id"], "status": EXISTING}
+                if role is not None and record["role"] != role:
+                    add_user_event(db, USER_UPDATED, {**record, "role": role})
+            elif email not in stored:
+                results[email] = {"email": email, "cognito_id": None, "status": CONFLICT}
+            elif stored[email]["cognito_id"] == row["cognito_id"]:
+                results[email] = {"email": email, "cognito_id": row["cognito_id"], "status": CREATED}
+                add_user_event(db, USER_CREATED, stored[email])
+            else:
+                results[email] = {"email": email, "cognito_id": stored[email]["cognito_id"], "status": EXISTING}
+
+    created = sum(result["status"] == CREATED for result in results.values())
+    logger.info(f"Bulk upsert of {len(unique_rows)} users: {created} created")
+    return [results[user["email"]] for user in users]
+
+async def iter_users(db: AsyncSession, fields=USER_FIELDS, role: str = None, email_prefix: str = None,
+                     after: int = None, limit: int = USER_LIST_DEFAULT_LIMIT):
+    """
+    Yield up to `limit` users as dicts of `fields`, ordered by id and starting after the id `after`.
+
+    Keyset pagination: every page is an index range scan on `id` (or on
+    `(role, id)` when filtering by role), never an OFFSET, so the cost of a
+    page does not grow with its position. Rows are streamed from the database
+    as they are read. Each dict also carries the row id under "id", which
+    callers use as the next `after`.
+    """
+    columns = [User.id] + [getattr(User, field) for field in fields if field != "id"]
+    stmt = select(*columns).order_by(User.id).limit(limit)
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    if role is not None:
+        stmt = stmt.where(User.role == role)
+    if email_prefix:
+        stmt = stmt.where(User.email.startswith(email_prefix, autoescape=True))
+
+    result = await db.stream(stmt)
+    try:
+        async for row in result.mappings():
+            yield dict(row)
+    finally:
+        await result.close()
+
+async def export_watermark(db: AsyncSession, lag: float = USER_EXPORT_SAFETY_LAG):
+    """
+    Return the upper bound of an export and the `updated_since` of the next one: the database's time minus `lag`.
+
+    `updated_at` is set when a row is written but only visible once its
+    transaction commits. A row written before the watermark by a transaction
+    still open when the export reads would be skipped by both exports; the
+    lag leaves such rows to the next export, as long as no transaction lasts
+    longer than `lag`.
+    """
+    return await db.scalar(select(func.now())) - timedelta(seconds=lag)
+
+async def iter_user_export(db: AsyncSession, until, updated_since=None, batch_size: int = USER_EXPORT_BATCH_SIZE):
+    """
+    Yield lists of at most `batch_size` user dicts updated in `[updated_since, until)`, in (updated_at, id) order.
+
+    Rows come from a server-side cursor `batch_size` at a time, so memory use
+    does not depend on the size of the table.
+    """
+    stmt = (
+        select(*[getattr(User, field) for field in EXPORT_FIELDS])
+        .where(User.updated_at < until)
+        .order_by(User.updated_at, User.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if updated_since is not None:
+        stmt = stmt.where(User.updated_at >= updated_since)
+
+    result = await db.stream(stmt)
+    try:
+        async for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+    finally:
+        await result.close()
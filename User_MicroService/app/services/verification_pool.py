@@ -0,0 +1,162 @@
+import os
+import asyncio
+import threading
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from app.services.auth_service import decode_jwts, token_kid, token_cache
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("user_service_verification_pool")
+
+# "thread" relies on the crypto backend releasing the GIL; "process" sidesteps it entirely
+TOKEN_VERIFY_POOL = os.getenv("TOKEN_VERIFY_POOL", "thread")
+TOKEN_VERIFY_WORKERS = int(os.getenv("TOKEN_VERIFY_WORKERS", str(os.cpu_count() or 1)))
+TOKEN_VERIFY_MAX_PENDING = int(os.getenv("TOKEN_VERIFY_MAX_PENDING", str(4 * TOKEN_VERIFY_WORKERS)))
+# Tokens verified by one worker job; smaller groups spread a batch over more workers
+TOKEN_VERIFY_GROUP_SIZE = int(os.getenv("TOKEN_VERIFY_GROUP_SIZE", "16"))
+
+
+def verify_token_group(kid: str, access_tokens: list) -> list:
+    # Module-level so it can be pickled for the process pool; the key is looked up in the worker
+    try:
+        return decode_jwts(access_tokens, kid)
+    except Exception as e:
+        # Only a plain exception crosses back to the parent: one it cannot unpickle (e.g. HTTPException)
+        # breaks the whole process pool
+        raise ValueError(f"{type(e).__name__}: {e}") from None
+
+
+class VerificationPool:
+    """
+    Fan token verification out to a pool of workers.
+
+    At most `max_pending` verifications are in flight; `submit` waits beyond
+    that, which stalls the calling consumer task and therefore its polling.
+    A broken executor (e.g. a worker process that died) fails the jobs it
+    held and is replaced, so later verifications get fresh workers.
+    """
+
+    def __init__(self, kind: str = TOKEN_VERIFY_POOL, workers: int = TOKEN_VERIFY_WORKERS,
+                 max_pending: int = TOKEN_VERIFY_MAX_PENDING, group_size: int = TOKEN_VERIFY_GROUP_SIZE):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown TOKEN_VERIFY_POOL: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.group_size = group_size
+        self.restarts = 0
+        self._executor = self._create_executor()
+        self._executor_lock = threading.Lock()
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def submit(self, fn, *args) -> asyncio.Future:
+        await self._slots.acquire()
+        try:
+            executor = self._executor
+            try:
+                concurrent_future = executor.submit(fn, *args)
+            except BrokenExecutor:
+                executor = self._replace_executor(executor)
+                concurrent_future = executor.submit(fn, *args)
+            future = asyncio.wrap_future(concurrent_future)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(partial(self._on_done, executor))
+        return future
+
+    async def verify_tokens(self, access_tokens: list) -> list:
+        """
+        Verify `access_tokens`, returning `(payload, error)` pairs in input order.
+        The error is the message of a failed verification, or the exception
+        when a token could not even be sent to a worker.
+
+        Cached payloads are answered directly. The misses are deduplicated,
+        grouped by the kid in their header and sent to the workers in groups of
+        at most `group_size`, so each job looks its signing key up only once.
+        """
+        results = [None] * len(access_tokens)
+        pending = {}
+        for index, access_token in enumerate(access_tokens):
+            payload = token_cache.get(access_token) if access_token else None
+            if payload is not None:
+                results[index] = (payload, None)
+            else:
+                pending.setdefault(access_token, []).append(index)
+
+        groups = {}
+        for access_token, indexes in pending.items():
+            try:
+                groups.setdefault(token_kid(access_token), []).append(access_token)
+            except Exception as e:
+                for index in indexes:
+                    results[index] = (None, e)
+
+        jobs = []
+        for kid, tokens in groups.items():
+            for start in range(0, len(tokens), self.group_size):
+                chunk = tokens[start:start + self.group_size]
+                jobs.append((chunk, await self.submit(verify_token_group, kid, chunk)))
+
+        for chunk, future in jobs:
+            try:
+                verified = await future
+            except Exception as e:
+                verified = [(None, e)] * len(chunk)
+            for access_token, (payload, error) in zip(chunk, verified):
+                if error is None:
+                    token_cache.put(access_token, payload)
+                for index in pending[access_token]:
+                    results[index] = (payload, error)
+        return results
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _create_executor(self):
+        if self.kind == "process":
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="token-verify")
+
+    def _on_done(self, executor, future) -> None:
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenExecutor):
+            self._replace_executor(executor)
+
+    def _replace_executor(self, broken):
+        """
+        Swap `broken` for a new executor, once, however many of its jobs report it.
+        """
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = self._create_executor()
+                self.restarts += 1
+                logger.info(f"Token verification pool was broken, restarted {self.kind} workers")
+            executor = self._executor
+        broken.shutdown(wait=False, cancel_futures=True)
+        return executor
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_verification_pool() -> VerificationPool:
+    """
+    Return the shared pool, created on first use so no workers are forked at import time.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = VerificationPool()
+            logger.info(f"Token verification pool started: {_pool.workers} {_pool.kind} workers")
+        return _pool
+
+
+def shutdown_verification_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,80 @@
+import time
+import hashlib
+import uuid
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from jose.utils import calculate_at_hash
+from app.services import auth_service, http_client
+
+
+class CognitoStub:
+    """
+    Local stand-in for the Cognito JWKS and token endpoints, signing real RS256 tokens.
+
+    Tokens carry the issuer and audience `auth_service` expects, so they go
+    through the real verification path. `install()` serves both endpoints to
+    the shared HTTP client from an in-process transport and seeds the JWKS
+    cache used by the synchronous path: nothing touches the network.
+    """
+
+    def __init__(self, kid: str = "bench-key"):
+        self.kid = kid
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        # Parsed once: loading a PEM key is far slower than signing with it
+        self.signing_key = jwk.construct(private_pem, "RS256")
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+        self.jwks = {"keys": [{**public_jwk, "kid": kid, "use": "sig", "alg": "RS256"}]}
+        self.jwks_requests = 0
+        self.token_requests = 0
+
+    @property
+    def issuer(self) -> str:
+        return f"https://cognito-idp.{auth_service.AWS_REGION}.amazonaws.com/{auth_service.COGNITO_USERPOOL_ID}"
+
+    def access_token(self, sub: str, ttl: float = 3600) -> str:
+        claims = {"sub": sub, "token_use": "access", "jti": str(uuid.uuid4())}
+        return self._sign(claims, ttl)
+
+    def id_token(self, sub: str, email: str, name: str, access_token: str, ttl: float = 3600) -> str:
+        claims = {
+            "sub": sub,
+            "email": email,
+            "given_name": name,
+            "token_use": "id",
+            "at_hash": calculate_at_hash(access_token, hashlib.sha256),
+        }
+        return self._sign(claims, ttl)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/.well-known/jwks.json"):
+            self.jwks_requests += 1
+            return httpx.Response(200, json=self.jwks)
+        if request.url.path == "/oauth2/token":
+            self.token_requests += 1
+            # The authorization code is the user's email, which is enough to mint its tokens
+            code = dict(httpx.QueryParams(request.content.decode()))["code"]
+            sub = str(uuid.uuid5(uuid.NAMESPACE_URL, code))
+            access_token = self.access_token(sub)
+            id_token = self.id_token(sub, code, code.split("@")[0], access_token)
+            return httpx.Response(200, json={"access_token": access_token, "id_token": id_token})
+        return httpx.Response(404)
+
+    def install(self) -> None:
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        auth_service.jwks_cache._store(auth_service.jwks_cache._parse(self.jwks["keys"]))
+
+    def _sign(self, claims: dict, ttl: float) -> str:
+        now = int(time.time())
+        claims = {**claims, "iss": self.issuer, "iat": now, "exp": now + int(ttl)}
+        if auth_service.CLIENT_ID:
+            claims["aud"] = auth_service.CLIENT_ID
+        return jwt.encode(claims, self.signing_key, algorithm="RS256", headers={"kid": self.kid})
+
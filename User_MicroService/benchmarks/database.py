@@ -0,0 +1,41 @@
+import os
+import tempfile
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.database import Base
+from app.metrics import instrument_queries
+from app.models.models import User
+
+
+def create_database(path: str = None):
+    """
+    Return an engine and session factory for a fresh SQLite database, in a temporary file by default.
+
+    The sessions are configured like the app's, so handlers behave as they do against MySQL.
+    """
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="user-service-bench-"), "bench.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    instrument_queries(engine.sync_engine)
+    session_factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    return engine, session_factory
+
+
+async def create_tables(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_users(session_factory, count: int, role: str = "tenant") -> list:
+    """
+    Insert `count` users and return their cognito ids.
+    """
+    rows = [
+        {"cognito_id": f"{role}-{i}", "name": f"User {i}", "email": f"{role}{i}@bench.local", "role": role}
+        for i in range(count)
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(User), rows)
+        await db.commit()
+    return [row["cognito_id"] for row in rows]
@@ -0,0 +1,114 @@
+import asyncio
+from dataclasses import dataclass, field
+from aiokafka.structs import TopicPartition
+
+
+@dataclass
+class Record:
+    # The attributes of aiokafka's ConsumerRecord that the service reads; `value` is replaced once decoded
+    topic: str
+    partition: int
+    offset: int
+    key: object
+    value: object
+    headers: list = field(default_factory=list)
+
+
+class FakeBroker:
+    """
+    In-memory Kafka: one append-only log per topic partition, with committed offsets per consumer group.
+
+    Values are stored as given: bytes encoded by the codec layer, as a real
+    broker would hold them, or plain objects when codecs are not under test.
+    Consumers receive a copy of each record, so decoding one leaves the log intact.
+    """
+
+    def __init__(self, partitions: int = 1):
+        self.partitions = partitions
+        self.logs = {}
+        self.committed = {}
+
+    def produce(self, topic: str, value, key=None, headers=None) -> Record:
+        partition = hash(key) % self.partitions if key is not None else 0
+        log = self.logs.setdefault(TopicPartition(topic, partition), [])
+        record = Record(topic, partition, len(log), key, value, headers or [])
+        log.append(record)
+        return record
+
+    def messages(self, topic: str) -> list:
+        return [record for tp, log in self.logs.items() if tp.topic == topic for record in log]
+
+    def consumer(self, topic: str, group_id: str) -> "FakeConsumer":
+        return FakeConsumer(self, topic, group_id)
+
+    def producer(self) -> "FakeProducer":
+        return FakeProducer(self)
+
+
+class FakeConsumer:
+    """
+    The subset of AIOKafkaConsumer used by BatchConsumer, resuming from the group's committed offsets.
+    """
+
+    def __init__(self, broker: FakeBroker, topic: str, group_id: str):
+        self.broker = broker
+        self.topic = topic
+        self.group_id = group_id
+        self.positions = {}
+
+    async def start(self) -> None:
+        for partition in range(self.broker.partitions):
+            tp = TopicPartition(self.topic, partition)
+            self.positions[tp] = self.broker.committed.get((self.group_id, tp), 0)
+
+    async def stop(self) -> None:
+        pass
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int = None) -> dict:
+        records = {}
+        budget = max_records
+        for tp, position in self.positions.items():
+            log = self.broker.logs.get(tp, [])
+            end = len(log) if budget is None else min(len(log), position + budget)
+            if end > position:
+                records[tp] = [Record(r.topic, r.partition, r.offset, r.key, r.value, r.headers) for r in log[position:end]]
+                self.positions[tp] = end
+                if budget is not None:
+                    budget -= end - position
+        if not records:
+            # Yield to the loop, as a real poll would
+            await asyncio.sleep(0)
+        return records
+
+    async def commit(self) -> None:
+        for tp, position in self.positions.items():
+            self.broker.committed[(self.group_id, tp)] = position
+
+    def highwater(self, tp: TopicPartition) -> int:
+        return len(self.broker.logs.get(tp, []))
+
+
+class FakeProducer:
+    """
+    The subset of AIOKafkaProducer used by ReplyProducer; every send is acknowledged at once.
+    """
+
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+        self.sent = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def send(self, topic: str, value, key=None, headers=None):
+        self.broker.produce(topic, value, key, headers)
+        self.sent += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    async def flush(self) -> None:
+        pass
@@ -0,0 +1,94 @@
+"""
+Benchmark the service against local stand-ins for Cognito, MySQL and Kafka.
+
+    python -m benchmarks.run                    # run and compare with benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline    # record this machine's baseline
+    python -m benchmarks.run --only "GET /callback" --samples 500
+
+Exits with status 1 when a scenario's p50 or throughput is worse than the
+baseline by more than --tolerance, or its p99 by more than --p99-tolerance.
+Baselines are only comparable on the machine that recorded them.
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from benchmarks.scenarios import SCENARIOS, run_scenarios
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Differences below this are timer noise, whatever the ratio
+NOISE_FLOOR_MS = 0.05
+
+
+def compare(results: dict, baseline: dict, tolerance: float, p99_tolerance: float) -> list:
+    """
+    Return a description of every regression of `results` against `baseline`.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, allowed in (("p50_ms", tolerance), ("p99_ms", p99_tolerance)):
+            limit = previous[metric] * (1 + allowed)
+            if current[metric] > limit and current[metric] - previous[metric] > NOISE_FLOOR_MS:
+                regressions.append(f"{name}: {metric} {current[metric]:.3f} > {previous[metric]:.3f} (+{allowed:.0%})")
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']:.1f} < {previous['throughput']:.1f} (-{tolerance:.0%})")
+    return regressions
+
+
+def format_table(results: dict, baseline: dict) -> str:
+    lines = [f"{'scenario':<30} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'base p50':>9} {'base p99':>9}"]
+    for name, result in results.items():
+        previous = baseline.get(name, {})
+        lines.append(
+            f"{name:<30} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['throughput']:>10.1f} "
+            f"{previous.get('p50_ms', float('nan')):>9.3f} {previous.get('p99_ms', float('nan')):>9.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=200, help="timed samples per scenario")
+    parser.add_argument("--only", action="append", choices=list(SCENARIOS), help="run only this scenario")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--p99-tolerance", type=float, default=0.5)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    # The service logs every request at INFO
+    logging.disable(logging.INFO)
+    results = asyncio.run(run_scenarios(args.samples, args.only))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_table(results, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({**baseline, **results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not baseline:
+        print("No baseline to compare with; record one with --save-baseline")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.p99_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import time
+import uuid
+import httpx
+from sqlalchemy import select
+from app.main import app, create_batch_consumers
+from app.database import get_db
+from app.models.models import User
+from app.services import auth_service, http_client, session_tokens
+from app.services.auth_service import token_cache
+from app.services.user_cache import user_cache
+from app.services.verification_pool import shutdown_verification_pool
+from app.services.kafka_producer import ReplyProducer
+from app.services.codecs import encode_message
+from benchmarks.cognito_stub import CognitoStub
+from benchmarks.database import create_database, create_tables, seed_users
+from benchmarks.fake_kafka import FakeBroker
+
+SEEDED_USERS = 2000
+VALIDATION_BATCH = 50
+TOKENS_PER_VALIDATION = 50
+CREATION_BATCH = 100
+TENANT_BATCH = 20
+TENANTS_PER_REQUEST = 50
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples: list, operations_per_sample: int = 1) -> dict:
+    total = sum(samples)
+    return {
+        "p50_ms": 1000 * percentile(samples, 0.50),
+        "p99_ms": 1000 * percentile(samples, 0.99),
+        "throughput": operations_per_sample * len(samples) / total if total else 0.0,
+    }
+
+
+class Bench:
+    """
+    The service wired to its local stand-ins: the Cognito stub, a SQLite database and the fake broker.
+
+    HTTP scenarios go through the whole ASGI app (middleware, routing,
+    dependencies) over an in-process transport; consumer scenarios drive the
+    app's BatchConsumers one `run_once()` batch at a time. Each scenario
+    method takes the number of samples to time and returns them in seconds.
+    """
+
+    def __init__(self, seeded_users: int = SEEDED_USERS):
+        self.seeded_users = seeded_users
+        self.stub = CognitoStub()
+        self.broker = FakeBroker()
+        self.engine, self.session_factory = create_database()
+        self.tenant_ids = []
+        self.client = None
+        self.consumers = {}
+        self.producer = None
+
+    async def setup(self) -> None:
+        self.stub.install()
+        await create_tables(self.engine)
+        self.tenant_ids = await seed_users(self.session_factory, self.seeded_users)
+
+        async def bench_get_db():
+            async with self.session_factory() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = bench_get_db
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+        # Replies are encoded like in production; the broker acknowledges them at once
+        self.producer = ReplyProducer(producer_factory=self.broker.producer, encoder=encode_message)
+        await self.producer.start()
+        for batch_consumer in create_batch_consumers(self.producer):
+            batch_consumer.consumer = self.broker.consumer(batch_consumer.name, "bench")
+            await batch_consumer.consumer.start()
+            if batch_consumer.session_factory is not None:
+                batch_consumer.session_factory = self.session_factory
+            self.consumers[batch_consumer.name] = batch_consumer
+
+    async def teardown(self) -> None:
+        await self.client.aclose()
+        app.dependency_overrides.pop(get_db, None)
+        await self.producer.close()
+        shutdown_verification_pool()
+        await http_client.shutdown()
+        await self.engine.dispose()
+
+    async def profile_cached(self, samples: int) -> list:
+        self.client.cookies.set("access_token", self.stub.access_token(self.tenant_ids[0]))
+        return [await self._time(self.client.get, "/user/profile", status=200) for _ in range(samples)]
+
+    async def profile_uncached(self, samples: int) -> list:
+        # Every request verifies the token signature and loads the user from the database
+        self.client.cookies.set("access_token", self.stub.access_token(self.tenant_ids[1]))
+        timings = []
+        for _ in range(samples):
+            token_cache.clear()
+            await user_cache.clear()
+            timings.append(await self._time(self.client.get, "/user/profile", status=200))
+        return timings
+
+    async def profile_session(self, samples: int) -> list:
+        # The user comes from a session token: no RSA verification, no cache, no query
+        self.client.cookies.clear()
+        async with self.session_factory() as db:
+            user = await db.scalar(select(User).where(User.cognito_id == self.tenant_ids[2]))
+        self.client.cookies.set(session_tokens.SESSION_COOKIE, session_tokens.issue_session_token(user))
+        session_tokens.SESSION_TOKENS_ENABLED = True
+        try:
+            return [await self._time(self.client.get, "/user/profile", status=200) for _ in range(samples)]
+        finally:
+            session_tokens.SESSION_TOKENS_ENABLED = False
+            self.client.cookies.clear()
+
+    async def callback(self, samples: int) -> list:
+        self.client.cookies.clear()
+        return [
+            await self._time(self.client.get, "/callback", params={"code": f"{uuid.uuid4().hex}@bench.local"}, status=307)
+            for _ in range(samples)
+        ]
+
+    async def users_page(self, samples: int) -> list:
+        # Listing is for admins; an allowlisted session user keeps authentication out of the timing
+        admin = User(cognito_id="bench-admin", name="Admin", email="admin@bench.local", role="landlord")
+        self.client.cookies.clear()
+        self.client.cookies.set(session_tokens.SESSION_COOKIE, session_tokens.issue_session_token(admin))
+        session_tokens.SESSION_TOKENS_ENABLED = True
+        admin_ids, auth_service.ADMIN_COGNITO_IDS = auth_service.ADMIN_COGNITO_IDS, frozenset({admin.cognito_id})
+        try:
+            return [await self._time(self.client.get, "/users", params={"limit": 100}, status=200) for _ in range(samples)]
+        finally:
+            auth_service.ADMIN_COGNITO_IDS = admin_ids
+            session_tokens.SESSION_TOKENS_ENABLED = False
+            self.client.cookies.clear()
+
+    async def validation_consumer(self, samples: int) -> list:
+        # Signing is slow, so every batch verifies the same tokens with the token cache cleared
+        tokens = self._tokens(VALIDATION_BATCH)
+        messages = [{"action": "validate_token", "access_token": tokens[i % len(tokens)], "correlation_id": str(uuid.uuid4())}
+                    for i in range(samples * VALIDATION_BATCH)]
+        return await self._consume("validation", messages, VALIDATION_BATCH, before_batch=token_cache.clear)
+
+    async def validation_batch_consumer(self, samples: int) -> list:
+        # One validate_tokens message per sample, carrying as many tokens as a batch of single requests
+        tokens = self._tokens(TOKENS_PER_VALIDATION)
+        messages = [{"action": "validate_tokens", "access_tokens": tokens, "correlation_id": str(uuid.uuid4())}
+                    for _ in range(samples)]
+        return await self._consume("validation", messages, 1, before_batch=token_cache.clear)
+
+    async def creation_consumer(self, samples: int) -> list:
+        messages = [
+            {"action": "create_user", "user_data": {"name": "New Tenant", "email": f"{uuid.uuid4().hex}@bench.local"}}
+            for _ in range(samples * CREATION_BATCH)
+        ]
+        return await self._consume("user creation", messages, CREATION_BATCH)
+
+    async def tenant_data_consumer(self, samples: int) -> list:
+        messages = []
+        for i in range(samples * TENANT_BATCH):
+            start = (i * TENANTS_PER_REQUEST) % (len(self.tenant_ids) - TENANTS_PER_REQUEST)
+            messages.append({"action": "get_tenants_data", "correlation_id": str(i),
+                             "tenant_ids": self.tenant_ids[start:start + TENANTS_PER_REQUEST]})
+        await user_cache.clear()
+        return await self._consume("tenant data", messages, TENANT_BATCH)
+
+    def _tokens(self, count: int) -> list:
+        return [self.stub.access_token(self.tenant_ids[i % len(self.tenant_ids)]) for i in range(count)]
+
+    async def _consume(self, name: str, messages: list, batch_size: int, before_batch=None) -> list:
+        batch_consumer = self.consumers[name]
+        batch_consumer.max_records = batch_size
+        for message in messages:
+            value, headers = encode_message(name, message)
+            self.broker.produce(name, value, headers=headers)
+
+        timings = []
+        for _ in range(len(messages) // batch_size):
+            if before_batch is not None:
+                before_batch()
+            start = time.perf_counter()
+            handled = await batch_consumer.run_once()
+            timings.append(time.perf_counter() - start)
+            assert handled == batch_size, f"{name} handled {handled} of {batch_size} messages"
+        return timings
+
+    @staticmethod
+    async def _time(request, *args, status: int, **kwargs) -> float:
+        start = time.perf_counter()
+        response = await request(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == status, f"{response.request.url}: {response.status_code} {response.text[:200]}"
+        return elapsed
+
+
+# name -> (Bench method, operations per timed sample)
+SCENARIOS = {
+    "GET /user/profile cached": ("profile_cached", 1),
+    "GET /user/profile uncached": ("profile_uncached", 1),
+    "GET /user/profile session": ("profile_session", 1),
+    "GET /callback": ("callback", 1),
+    "GET /users": ("users_page", 1),
+    "consumer validation": ("validation_consumer", VALIDATION_BATCH),
+    "consumer validation batch": ("validation_batch_consumer", TOKENS_PER_VALIDATION),
+    "consumer user creation": ("creation_consumer", CREATION_BATCH),
+    "consumer tenant data": ("tenant_data_consumer", TENANT_BATCH),
+}
+
+
+async def run_scenarios(samples: int, names=None, warmup: int = 5) -> dict:
+    """
+    Run the selected scenarios (all by default) and return their p50/p99 latency and throughput.
+
+    Consumer latencies are per batch and their throughput is in messages per second.
+    """
+    bench = Bench()
+    await bench.setup()
+    results = {}
+    try:
+        for name, (method, operations) in SCENARIOS.items():
+            if names and name not in names:
+                continue
+            scenario = getattr(bench, method)
+            await scenario(warmup)
+            results[name] = summarize(await scenario(samples), operations)
+    finally:
+        await bench.teardown()
+    return results
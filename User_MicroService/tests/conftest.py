@@ -1,23 +1,32 @@
+import asyncio
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from app.main import app
 from app.database import get_db, Base
+from app.models.models import User
+from app.services import auth_service
+from app.services.auth_service import get_current_user
+from app.metrics import instrument_queries
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_tasks.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test_tasks.db"
 
 # Set up the test database engine and session
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+instrument_queries(async_engine.sync_engine)  # Timed like the app's engine
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Override the `get_db` dependency to use test database
-def override_get_db() -> Session:
-    db = TestingSessionLocal()
-    try:
+async def override_get_db() -> AsyncSession:
+    async with AsyncTestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
@@ -43,3 +52,38 @@ def db_session():
 
     # Clean up tables after tests
     Base.metadata.drop_all(bind=engine)
+
+@pytest_asyncio.fixture(scope="function")
+async def async_db_session():
+    Base.metadata.create_all(bind=engine)
+
+    async with AsyncTestingSessionLocal() as session:
+        yield session
+        await session.rollback()
+
+    await async_engine.dispose()
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def sign_in(monkeypatch):
+    # Authenticates every request as a user with the given role, without tokens; `admin` allowlists them
+    def sign_in_as(role, admin=False):
+        user = User(cognito_id=f"{role}_id", name=role.title(), email=f"{role}@example.com", role=role)
+        app.dependency_overrides[get_current_user] = lambda: user
+        if admin:
+            monkeypatch.setattr(auth_service, "ADMIN_COGNITO_IDS", frozenset({user.cognito_id}))
+        return user
+    yield sign_in_as
+    app.dependency_overrides.pop(get_current_user, None)
+
+@pytest.fixture(scope="function")
+def admin(sign_in):
+    return sign_in("landlord", admin=True)
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    from app.services import auth_service
+    auth_service.jwks_cache.clear()
+    auth_service.token_cache.clear()
+    asyncio.run(auth_service.user_cache.clear())
+    yield
@@ -0,0 +1,72 @@
+import csv
+import json
+from datetime import datetime
+from fastapi import status
+from app.models.models import User
+
+
+def test_db_pool_status(client):
+    response = client.get("/admin/db/pool")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "checkout_wait_max_ms" in response.json()["async"]
+
+
+def test_kafka_producer_status(client):
+    response = client.get("/admin/kafka/producer")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert {"sent", "delivered", "errors", "pending"} <= set(response.json())
+
+
+def test_kafka_outbox_status(client):
+    response = client.get("/admin/kafka/outbox")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["pending"] == 0
+    assert {"published", "batches", "errors"} <= set(response.json())
+
+
+def add_exported_users(db_session):
+    db_session.add_all([
+        User(cognito_id="old_id", name="Old", email="old@example.com", role="tenant", updated_at=datetime(2024, 1, 1)),
+        User(cognito_id="new_id", name="New", email="new@example.com", role="landlord", updated_at=datetime(2024, 6, 1)),
+    ])
+    db_session.commit()
+
+
+def test_export_users_as_ndjson(client, db_session, admin):
+    add_exported_users(db_session)
+
+    response = client.get("/admin/users/export")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["email"] for row in rows] == ["old@example.com", "new@example.com"]
+    assert rows[1]["updated_at"] == "2024-06-01T00:00:00"
+    assert "X-Export-Watermark" in response.headers
+
+
+def test_export_users_since_watermark_as_csv(client, db_session, admin):
+    add_exported_users(db_session)
+
+    response = client.get("/admin/users/export", params={"format": "csv", "updated_since": "2024-03-01T00:00:00"})
+
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert [row["email"] for row in rows] == ["new@example.com"]
+    assert rows[0]["role"] == "landlord"
+
+
+def test_export_users_rejects_unknown_format(client, admin):
+    assert client.get("/admin/users/export", params={"format": "xml"}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_export_users_requires_authentication(client):
+    assert client.get("/admin/users/export").status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_export_users_is_forbidden_to_non_admins(client, sign_in):
+    sign_in("tenant")
+
+    assert client.get("/admin/users/export").status_code == status.HTTP_403_FORBIDDEN
@@ -1,9 +1,11 @@
 # test_auth.py
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 from fastapi import status
+from app.models.models import User
+from app.services.session_tokens import verify_session_token
 
-@patch("app.services.auth_service.exchange_code_for_tokens")
-@patch("app.services.auth_service.decode_jwt")
+@patch("app.services.auth_service.exchange_code_for_tokens", new_callable=AsyncMock)
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
 def test_login_logout_flow(mock_decode_jwt, mock_exchange_code_for_tokens, client):
 
     # Log to verify the mocked methods
@@ -42,7 +44,7 @@ def test_callback_missing_code(client):
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert response.json() == {"detail": "Authorization code missing"}
 
-@patch("app.services.auth_service.exchange_code_for_tokens")
+@patch("app.services.auth_service.exchange_code_for_tokens", new_callable=AsyncMock)
 def test_callback_missing_tokens(mock_exchange_code_for_tokens, client):
     # Configurar o mock para retornar um dicionário sem os tokens
     mock_exchange_code_for_tokens.return_value = {
@@ -59,3 +61,43 @@ def test_callback_missing_tokens(mock_exchange_code_for_tokens, client):
 
     # Verificar se a mensagem de erro é a correta
     assert response.json() == {"detail": "ID or Access Token missing"}
+
+
+@patch("app.services.session_tokens.SESSION_TOKENS_ENABLED", True)
+@patch("app.services.auth_service.exchange_code_for_tokens", new_callable=AsyncMock)
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_callback_sets_a_session_token(mock_decode_jwt, mock_exchange_code_for_tokens, client):
+    mock_exchange_code_for_tokens.return_value = {"id_token": "test_id_token", "access_token": "test_access_token"}
+    mock_decode_jwt.return_value = {"sub": "test_cognito_id", "email": "testuser@example.com", "given_name": "Test User"}
+
+    response = client.get("/callback?code=test_authorization_code", follow_redirects=False)
+
+    claims = verify_session_token(response.cookies.get("session_token"))
+    assert (claims["sub"], claims["email"]) == ("test_cognito_id", "testuser@example.com")
+
+
+@patch("app.services.session_tokens.SESSION_TOKENS_ENABLED", True)
+@patch("app.services.auth_service.validate_access_token_async", new_callable=AsyncMock)
+def test_refresh_reissues_the_session_token_from_the_database(mock_validate, client, db_session):
+    mock_validate.return_value = {"sub": "test_cognito_id"}
+    db_session.add(User(cognito_id="test_cognito_id", name="Test User", email="testuser@example.com", role="tenant"))
+    db_session.commit()
+    client.cookies.set("access_token", "test_access_token")
+
+    response = client.post("/auth/refresh")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert verify_session_token(response.cookies.get("session_token"))["role"] == "tenant"
+
+
+@patch("app.services.session_tokens.SESSION_TOKENS_ENABLED", True)
+def test_refresh_requires_the_access_token(client):
+    response = client.post("/auth/refresh")
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_refresh_is_not_found_when_session_tokens_are_disabled(client):
+    response = client.post("/auth/refresh")
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,28 @@
+from unittest.mock import patch, AsyncMock
+from fastapi import status
+
+
+def test_liveness(client):
+    response = client.get("/health/live")
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+@patch("app.container.container.readiness", new_callable=AsyncMock)
+def test_ready_when_all_backends_connected(mock_readiness, client):
+    mock_readiness.return_value = {"database": "connected", "kafka": "disabled"}
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "ready"
+
+
+@patch("app.container.container.readiness", new_callable=AsyncMock)
+def test_not_ready_while_a_backend_is_pending(mock_readiness, client):
+    mock_readiness.return_value = {"database": "connected", "kafka": "pending"}
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["backends"]["kafka"] == "pending"
@@ -1,9 +1,9 @@
 # test_user_routes.py
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from fastapi.testclient import TestClient
 from app.schemas import UserBase
-from app.models.models import User
+from app.models.models import User, OutboxEvent
 from app.main import app
 from fastapi import status
 
@@ -32,4 +32,151 @@ def test_create_the_same_user(client, new_user):
     assert response.status_code == status.HTTP_201_CREATED
 
     response = client.post("/users/", json=new_user.model_dump())
-    assert response.status_code == status.HTTP_400_BAD_REQUEST
\ No newline at end of file
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_update_user_profile(mock_decode_jwt, client, db_session, new_user):
+    mock_decode_jwt.return_value = {"sub": new_user.cognito_id}
+    db_session.add(User(**new_user.model_dump()))
+    db_session.commit()
+
+    client.cookies.set("access_token", "test_token")
+    response = client.put("/user/profile/update", json={"name": "Jane Doe", "email": "janedoe@example.com", "role": "landlord"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["name"] == "Jane Doe"
+
+    db_session.expire_all()
+    db_user = db_session.query(User).filter(User.cognito_id == new_user.cognito_id).first()
+    assert db_user.email == "janedoe@example.com"
+    assert db_user.role == "landlord"
+
+    # The change is published through the outbox
+    event = db_session.query(OutboxEvent).one()
+    assert event.payload["type"] == "user.updated"
+    assert event.payload["user"]["email"] == "janedoe@example.com"
+
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_profile_reflects_update_after_caching(mock_decode_jwt, client, db_session, new_user):
+    mock_decode_jwt.return_value = {"sub": new_user.cognito_id}
+    db_session.add(User(**new_user.model_dump()))
+    db_session.commit()
+    client.cookies.set("access_token", "test_token")
+
+    assert client.get("/user/profile").json()["name"] == "John Doe"
+    client.put("/user/profile/update", json={"name": "Jane Doe", "email": "janedoe@example.com", "role": "landlord"})
+
+    assert client.get("/user/profile").json()["name"] == "Jane Doe"
+
+def test_create_users_bulk(client, new_user, admin):
+    client.post("/users/", json=new_user.model_dump())
+    users = [
+        new_user.model_dump(),
+        {"name": "Jane Doe", "email": "janedoe@example.com", "cognito_id": "jane_cognito_id", "role": "tenant"},
+    ]
+
+    response = client.post("/users/bulk", json={"users": users})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["created"] == 1
+    assert [result["status"] for result in response.json()["results"]] == ["existing", "created"]
+    assert response.json()["results"][1]["cognito_id"] == "jane_cognito_id"
+
+def test_create_users_bulk_ignores_ids_and_roles_from_landlords(client, db_session, new_user, sign_in):
+    sign_in("landlord")
+
+    response = client.post("/users/bulk", json={"users": [new_user.model_dump()]})
+
+    assert response.status_code == status.HTTP_200_OK
+    [result] = response.json()["results"]
+    assert result["status"] == "created"
+    assert result["cognito_id"] != new_user.cognito_id
+    assert db_session.query(User).filter(User.email == new_user.email).one().role is None
+
+def test_create_users_bulk_does_not_assign_admin_roles(client, new_user, admin):
+    users = [{**new_user.model_dump(), "role": "admin"}]
+
+    assert client.post("/users/bulk", json={"users": users}).status_code == status.HTTP_403_FORBIDDEN
+
+def test_create_users_bulk_is_forbidden_to_tenants(client, new_user, sign_in):
+    sign_in("tenant")
+
+    assert client.post("/users/bulk", json={"users": [new_user.model_dump()]}).status_code == status.HTTP_403_FORBIDDEN
+
+def test_create_users_bulk_rejects_oversized_requests(client, new_user, admin):
+    with patch("app.routes.user_routes.USER_BULK_MAX_ROWS", 1):
+        response = client.post("/users/bulk", json={"users": [new_user.model_dump()] * 2})
+
+    assert response.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+
+def add_users(db_session, count, role="tenant"):
+    for i in range(count):
+        db_session.add(User(cognito_id=f"{role}_{i}", name=f"User {i}", email=f"{role}{i}@example.com", role=role))
+    db_session.commit()
+
+def test_list_users_pages_by_id(client, db_session, admin):
+    add_users(db_session, 5)
+
+    first = client.get("/users", params={"limit": 2}).json()
+    second = client.get("/users", params={"limit": 2, "after": first["next_after"]}).json()
+    last = client.get("/users", params={"limit": 2, "after": second["next_after"]}).json()
+
+    emails = [user["email"] for page in (first, second, last) for user in page["users"]]
+    assert emails == [f"tenant{i}@example.com" for i in range(5)]
+    assert last["next_after"] is None
+
+def test_list_users_filters_and_projects(client, db_session, admin):
+    add_users(db_session, 2, role="tenant")
+    add_users(db_session, 2, role="landlord")
+
+    response = client.get("/users", params={"role": "landlord", "email_prefix": "landlord1", "fields": "email,role"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"users": [{"email": "landlord1@example.com", "role": "landlord"}], "next_after": None}
+
+def test_list_users_rejects_unknown_fields(client, admin):
+    response = client.get("/users", params={"fields": "email,password"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_list_users_requires_authentication(client):
+    assert client.get("/users").status_code == status.HTTP_401_UNAUTHORIZED
+
+@patch("app.services.session_tokens.SESSION_TOKENS_ENABLED", True)
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_users_cannot_grant_themselves_admin_rights(mock_decode_jwt, client, db_session, new_user):
+    mock_decode_jwt.return_value = {"sub": new_user.cognito_id}
+    db_session.add(User(**{**new_user.model_dump(), "role": "tenant"}))
+    db_session.commit()
+    client.cookies.set("access_token", "test_token")
+
+    response = client.put("/user/profile/update", json={"name": "John Doe", "email": new_user.email, "role": "admin"})
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert client.get("/users").status_code == status.HTTP_403_FORBIDDEN
+    assert client.get("/admin/users/export").status_code == status.HTTP_403_FORBIDDEN
+
+    # Even a stored admin role, however it got there, grants nothing
+    db_session.query(User).update({"role": "admin"})
+    db_session.commit()
+    assert client.get("/users").status_code == status.HTTP_403_FORBIDDEN
+
+def test_anonymous_callers_cannot_create_admins(client, new_user):
+    admin = {**new_user.model_dump(), "role": "admin"}
+
+    assert client.post("/users/", json=admin).status_code == status.HTTP_403_FORBIDDEN
+    assert client.post("/users/bulk", json={"users": [admin]}).status_code == status.HTTP_401_UNAUTHORIZED
+
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_cognito_admin_group_grants_admin_rights(mock_decode_jwt, client, db_session, new_user):
+    mock_decode_jwt.return_value = {"sub": new_user.cognito_id, "cognito:groups": ["admin"]}
+    db_session.add(User(**new_user.model_dump()))
+    db_session.commit()
+    client.cookies.set("access_token", "test_token")
+
+    assert client.get("/users").status_code == status.HTTP_200_OK
+
+def test_list_users_is_forbidden_to_non_admins(client, sign_in):
+    sign_in("landlord")
+
+    assert client.get("/users").status_code == status.HTTP_403_FORBIDDEN
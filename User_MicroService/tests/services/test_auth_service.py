@@ -1,18 +1,22 @@
 import pytest
-from unittest.mock import patch, Mock
-from app.services.auth_service import exchange_code_for_tokens, decode_jwt, get_or_create_user, get_current_user
-from app.models.models import User
+from unittest.mock import patch, Mock, AsyncMock
+from app.services.auth_service import exchange_code_for_tokens, decode_jwt, decode_jwts, get_or_create_user, get_current_user
+from app.services.user_cache import user_cache
+from app.services.session_tokens import issue_session_token
+from sqlalchemy import select
+from app.models.models import User, OutboxEvent
 from jose import jwt, JWTError
 from fastapi import status, HTTPException
 
 
-@patch("requests.post")
-def test_exchange_code_for_tokens(mock_post, client):
+@pytest.mark.asyncio
+@patch("app.services.auth_service.request_with_retry", new_callable=AsyncMock)
+async def test_exchange_code_for_tokens(mock_post, client):
     # Mocking the response from Cognito
     mock_post.return_value = Mock(status_code=200, json=lambda: {"access_token": "test_access_token", "id_token": "test_id_token"})
 
     code = "test_code"
-    tokens = exchange_code_for_tokens(code)
+    tokens = await exchange_code_for_tokens(code)
 
     # Verify the response
     assert "access_token" in tokens
@@ -20,27 +24,25 @@ def test_exchange_code_for_tokens(mock_post, client):
     assert tokens["access_token"] == "test_access_token"
     assert tokens["id_token"] == "test_id_token"
 
-@patch("requests.post")
-def test_exchange_code_for_tokens_error(mock_post, client):
+@pytest.mark.asyncio
+@patch("app.services.auth_service.request_with_retry", new_callable=AsyncMock)
+async def test_exchange_code_for_tokens_error(mock_post, client):
     # Mocking the response from Cognito
     mock_post.return_value = Mock(status_code=400)
 
     code = "test_code"
     with pytest.raises(HTTPException):
-        exchange_code_for_tokens(code)
+        await exchange_code_for_tokens(code)
 
+# Create a fake token header with the matching kid, and mock the token payload.
+# Patched for this test only: replacing them on the module would leak into every later test
+@patch.object(jwt, "decode", Mock(return_value={"sub": "test_cognito_id"}))
+@patch.object(jwt, "get_unverified_headers", Mock(return_value={"kid": "test_kid"}))
 @patch("requests.get")
 def test_decode_jwt(mock_get):
     # Mocking the response from Cognito keys endpoint
     mock_get.return_value = Mock(status_code=200, json=lambda: {"keys": [{"kid": "test_kid", "kty": "RSA", "alg": "RS256", "use": "sig", "n": "test_n", "e": "AQAB"}]})
 
-    # Create a fake token header with the matching kid
-    headers = {"kid": "test_kid"}
-    jwt.get_unverified_headers = Mock(return_value=headers)
-
-    # Mock token payload
-    jwt.decode = Mock(return_value={"sub": "test_cognito_id"})
-
     token = "test_token"
     payload = decode_jwt(token, token)
 
@@ -48,7 +50,51 @@ def test_decode_jwt(mock_get):
     assert "sub" in payload
     assert payload["sub"] == "test_cognito_id"
 
-@patch("app.services.auth_service.decode_jwt")
+@patch("app.services.auth_service._verify_jwt")
+@patch("app.services.auth_service.jwks_cache")
+def test_decode_jwts_looks_the_key_up_once(mock_jwks_cache, mock_verify_jwt):
+    error = HTTPException(status_code=401, detail="Token is invalid")
+    mock_verify_jwt.side_effect = [{"sub": "first"}, error, {"sub": "third"}]
+
+    results = decode_jwts(["first", "bad", "third"], "test_kid")
+
+    # Messages rather than exception objects, so the results can be pickled back from a worker process
+    assert results == [({"sub": "first"}, None), (None, "Token is invalid"), ({"sub": "third"}, None)]
+    mock_jwks_cache.get_key.assert_called_once_with("test_kid")
+
+@patch("app.services.session_tokens.SESSION_TOKENS_ENABLED", True)
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_get_current_user_from_session_token_skips_jwt_and_database(mock_decode_jwt, client):
+    user = User(id=1, cognito_id="test_cognito_id", name="Test User", email="testuser@example.com", role="tenant")
+    client.cookies.set("session_token", issue_session_token(user))
+
+    # No user row exists: the profile can only come from the token
+    response = client.get("/user/profile")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["cognito_id"] == "test_cognito_id"
+    mock_decode_jwt.assert_not_called()
+
+@pytest.mark.parametrize("session_token", [
+    "garbage",
+    # {"alg":"HS256","kid":["x"]}: an unhashable kid
+    "eyJhbGciOiJIUzI1NiIsImtpZCI6WyJ4Il19.e30.c2ln",
+])
+@patch("app.services.session_tokens.SESSION_TOKENS_ENABLED", True)
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_get_current_user_falls_back_to_access_token_on_invalid_session(mock_decode_jwt, client, db_session, session_token):
+    mock_decode_jwt.return_value = {"sub": "test_cognito_id"}
+    db_session.add(User(cognito_id="test_cognito_id", email="testuser@example.com", name="Test User"))
+    db_session.commit()
+    client.cookies.set("session_token", session_token)
+    client.cookies.set("access_token", "test_token")
+
+    response = client.get("/user/profile")
+
+    assert response.status_code == status.HTTP_200_OK
+    mock_decode_jwt.assert_awaited_once()
+
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
 def test_get_current_user(mock_decode_jwt, client, db_session):
     # Mock the decoded payload to simulate a valid token
     mock_decode_jwt.return_value = {"sub": "test_cognito_id"}
@@ -70,7 +116,23 @@ def test_get_current_user(mock_decode_jwt, client, db_session):
     assert response.json()["email"] == "testuser@example.com"
     assert response.json()["name"] == "Test User"
 
-@patch("app.services.auth_service.decode_jwt")
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+def test_get_current_user_is_served_from_cache(mock_decode_jwt, client, db_session):
+    mock_decode_jwt.return_value = {"sub": "test_cognito_id"}
+    db_session.add(User(cognito_id="test_cognito_id", email="testuser@example.com", name="Test User"))
+    db_session.commit()
+    client.cookies.set("access_token", "test_token")
+    assert client.get("/user/profile").status_code == 200
+
+    # The second request must not query the database
+    db_session.query(User).delete()
+    db_session.commit()
+    response = client.get("/user/profile")
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "testuser@example.com"
+
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
 def test_get_current_user_user_not_found(mock_decode_jwt, client, db_session):
     # Mock the decoded payload to simulate a valid token
     mock_decode_jwt.return_value = {"sub": "test_cognito_id"}
@@ -85,7 +147,7 @@ def test_get_current_user_user_not_found(mock_decode_jwt, client, db_session):
     assert response.status_code == 401
     assert response.json()["detail"] == "User not found"
 
-@patch("app.services.auth_service.decode_jwt")
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
 def test_get_current_user_invalid_token(mock_decode_jwt, client):
     # Mock the decode_jwt function to raise a JWTError
     mock_decode_jwt.side_effect = JWTError("Invalid token")
@@ -133,8 +195,14 @@ def test_get_current_user_no_cognito_id(mock_get_current_user, client):
     assert response.json()["detail"] == "Access token missing from cookies"
 
 
-@patch("app.main.producer.send")
-def test_get_or_create_user_creates_new_user(mock_producer, db_session):
+async def id_updates(db):
+    return list((await db.execute(select(OutboxEvent.payload).where(OutboxEvent.topic == "user-id-update"))).scalars())
+
+async def user_event_types(db):
+    return [payload["type"] for payload in (await db.execute(select(OutboxEvent.payload).where(OutboxEvent.topic == "user-events"))).scalars()]
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_creates_new_user(async_db_session):
     """
     Test that a new user is created when they do not exist in the database.
     """
@@ -144,18 +212,27 @@ def test_get_or_create_user_creates_new_user(mock_producer, db_session):
         "given_name": "New User"
     }
 
-    user = get_or_create_user(user_info, db_session)
+    user = await get_or_create_user(user_info, async_db_session)
 
     # Verify the new user is created
     assert user.cognito_id == "new_cognito_id"
     assert user.email == "newuser@example.com"
     assert user.name == "New User"
 
-    # Ensure no Kafka messages are sent
-    mock_producer.assert_not_called()
+    # Ensure no id update is queued
+    assert await id_updates(async_db_session) == []
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_announces_first_login_only(async_db_session):
+    user_info = {"sub": "new_cognito_id", "email": "newuser@example.com", "given_name": "New User"}
 
-@patch("app.main.producer.send")
-def test_get_or_create_user_existing_user_no_update(mock_producer, db_session):
+    await get_or_create_user(user_info, async_db_session)
+    await get_or_create_user(user_info, async_db_session)
+
+    assert await user_event_types(async_db_session) == ["user.created"]
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_existing_user_no_update(async_db_session):
     """
     Test that an existing user with a non-tenant role is not updated.
     """
@@ -166,8 +243,8 @@ def test_get_or_create_user_existing_user_no_update(mock_producer, db_session):
         name="Test User",
         role="landlord"
     )
-    db_session.add(user)
-    db_session.commit()
+    async_db_session.add(user)
+    await async_db_session.commit()
 
     user_info = {
         "sub": "new_cognito_id",
@@ -175,18 +252,18 @@ def test_get_or_create_user_existing_user_no_update(mock_producer, db_session):
         "given_name": "Updated User"
     }
 
-    result = get_or_create_user(user_info, db_session)
+    result = await get_or_create_user(user_info, async_db_session)
 
     # Verify the user is not updated
     assert result.cognito_id == "existing_cognito_id"
     assert result.email == "testuser@example.com"
     assert result.name == "Test User"
 
-    # Ensure no Kafka messages are sent
-    mock_producer.assert_not_called()
+    # Ensure no id update is queued
+    assert await id_updates(async_db_session) == []
 
-@patch("app.main.producer.send")
-def test_get_or_create_user_tenant_role_updates_cognito_id(mock_producer, db_session):
+@pytest.mark.asyncio
+async def test_get_or_create_user_tenant_role_updates_cognito_id(async_db_session):
     """
     Test that an existing tenant user's cognito_id is updated and a Kafka message is sent.
     """
@@ -197,8 +274,8 @@ def test_get_or_create_user_tenant_role_updates_cognito_id(mock_producer, db_ses
         name="Tenant User",
         role="tenant"
     )
-    db_session.add(user)
-    db_session.commit()
+    async_db_session.add(user)
+    await async_db_session.commit()
 
     user_info = {
         "sub": "new_cognito_id",
@@ -206,18 +283,28 @@ def test_get_or_create_user_tenant_role_updates_cognito_id(mock_producer, db_ses
         "given_name": "Updated Tenant User"
     }
 
-    result = get_or_create_user(user_info, db_session)
+    result = await get_or_create_user(user_info, async_db_session)
 
     # Verify the cognito_id is updated
     assert result.cognito_id == "new_cognito_id"
     assert result.email == "tenant@example.com"
     assert result.name == "Tenant User"
 
-    # Verify Kafka message is sent
-    mock_producer.assert_called_once_with(
-        'user-id-update',
-        {
-            "old_id": "old_cognito_id",
-            "new_id": "new_cognito_id"
-        }
-    )
\ No newline at end of file
+    # The cached record moves to the new id
+    assert await user_cache.get("old_cognito_id") is None
+    assert (await user_cache.get("new_cognito_id"))["email"] == "tenant@example.com"
+
+    # Verify the id update is queued in the outbox
+    assert await id_updates(async_db_session) == [{"old_id": "old_cognito_id", "new_id": "new_cognito_id"}]
+@pytest.mark.asyncio
+async def test_get_or_create_user_swaps_tenant_id_once(async_db_session):
+    async_db_session.add(User(cognito_id="old_cognito_id", email="tenant@example.com", name="Tenant User", role="tenant"))
+    await async_db_session.commit()
+    user_info = {"sub": "new_cognito_id", "email": "tenant@example.com", "given_name": "Tenant User"}
+
+    first = await get_or_create_user(user_info, async_db_session)
+    second = await get_or_create_user(user_info, async_db_session)
+
+    assert first.id == second.id
+    assert second.cognito_id == "new_cognito_id"
+    assert len(await id_updates(async_db_session)) == 1
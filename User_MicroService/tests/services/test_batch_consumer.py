@@ -0,0 +1,220 @@
+import asyncio
+import pytest
+from collections import namedtuple
+from types import SimpleNamespace
+from unittest.mock import Mock, AsyncMock, MagicMock
+from sqlalchemy.exc import OperationalError
+from aiokafka.errors import KafkaError
+from app.services.batch_consumer import BatchConsumer, Reply, correlation_id_of, after_commit
+from app.services.kafka_producer import ReplyProducer
+from app.services.codecs import encode_message
+
+Message = namedtuple("Message", ["offset", "value", "headers"], defaults=(None,))
+
+
+def make_consumer(*partitions):
+    consumer = AsyncMock()
+    # highwater() is synchronous on AIOKafkaConsumer
+    consumer.highwater = Mock(return_value=None)
+    consumer.getmany.return_value = {f"partition_{i}": messages for i, messages in enumerate(partitions)}
+    return consumer
+
+
+def make_producer(failing_topic=None):
+    producer = AsyncMock()
+
+    async def send(topic, value, key=None, headers=None):
+        # Acknowledged at once, like a delivery future the broker has completed
+        future = asyncio.get_running_loop().create_future()
+        if topic == failing_topic:
+            future.set_exception(KafkaError("delivery failed"))
+        else:
+            future.set_result(None)
+        return future
+
+    producer.send.side_effect = send
+    return producer
+
+
+def make_session_factory():
+    session = AsyncMock()
+    session.info = {}
+    factory = MagicMock()
+    factory.return_value.__aenter__.return_value = session
+    return factory, session
+
+
+async def echo_handler(messages, db):
+    return [Reply("replies", message.value) for message in messages]
+
+
+def make_batch_consumer(consumer, producer, handler, session_factory=None):
+    batch_consumer = BatchConsumer("test", lambda: consumer, producer, handler, session_factory)
+    batch_consumer.consumer = consumer
+    return batch_consumer
+
+
+@pytest.mark.asyncio
+async def test_batch_is_handled_in_one_transaction_and_committed_after_flush():
+    consumer = make_consumer([Message(0, "a"), Message(1, "b")], [Message(0, "c")])
+    producer = make_producer()
+    session_factory, session = make_session_factory()
+    calls = Mock()
+    calls.attach_mock(producer, "producer")
+    calls.attach_mock(consumer, "consumer")
+
+    handled = await make_batch_consumer(consumer, producer, echo_handler, session_factory).run_once()
+
+    assert handled == 3
+    session.commit.assert_awaited_once()
+    assert [c.args for c in producer.send.call_args_list] == [("replies", "a"), ("replies", "b"), ("replies", "c")]
+    # Offsets are committed only after the replies have been flushed
+    names = [name for name, *_ in calls.mock_calls]
+    assert names.index("producer.flush") < names.index("consumer.commit")
+
+
+@pytest.mark.asyncio
+async def test_raw_values_are_decoded_and_undecodable_ones_skipped():
+    raw = [SimpleNamespace(topic="requests", offset=0, value=b'{"n": 1}', headers=[("content-type", b"application/json")]),
+           SimpleNamespace(topic="requests", offset=1, value=b"not json", headers=[])]
+    consumer = make_consumer(raw)
+    producer = make_producer()
+
+    handled = await make_batch_consumer(consumer, producer, echo_handler).run_once()
+
+    assert handled == 2
+    assert [c.args for c in producer.send.call_args_list] == [("replies", {"n": 1})]
+    consumer.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_unencodable_reply_is_skipped_and_the_batch_committed():
+    consumer = make_consumer([Message(0, {"n": 1}), Message(1, {"n": object()}), Message(2, {"n": 3})])
+    kafka_producer = make_producer()
+    producer = ReplyProducer(producer_factory=lambda: kafka_producer, encoder=encode_message)
+    await producer.start()
+
+    handled = await make_batch_consumer(consumer, producer, echo_handler).run_once()
+
+    assert handled == 3
+    assert [c.args[1] for c in kafka_producer.send.call_args_list] == [b'{"n":1}', b'{"n":3}']
+    consumer.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_fails_the_batch_before_commit():
+    consumer = make_consumer([Message(0, "a")])
+    producer = make_producer(failing_topic="replies")
+
+    with pytest.raises(KafkaError):
+        await make_batch_consumer(consumer, producer, echo_handler).run_once()
+
+    producer.flush.assert_awaited_once()
+    consumer.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_empty_poll_does_not_commit():
+    consumer = make_consumer()
+    producer = make_producer()
+
+    assert await make_batch_consumer(consumer, producer, echo_handler).run_once() == 0
+    consumer.commit.assert_not_called()
+    producer.flush.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_message_by_message():
+    consumer = make_consumer([Message(0, "good"), Message(1, "bad"), Message(2, "good too")])
+    producer = make_producer()
+    session_factory, session = make_session_factory()
+
+    async def handler(messages, db):
+        if any(message.value == "bad" for message in messages):
+            raise ValueError("bad message")
+        return await echo_handler(messages, db)
+
+    await make_batch_consumer(consumer, producer, handler, session_factory).run_once()
+
+    assert [c.args for c in producer.send.call_args_list] == [("replies", "good"), ("replies", "good too")]
+    assert session.rollback.await_count == 2
+    consumer.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_after_commit_callbacks_run_only_for_committed_batches():
+    consumer = make_consumer([Message(0, "good"), Message(1, "bad")])
+    session_factory, _ = make_session_factory()
+    callback = AsyncMock()
+
+    async def handler(messages, db):
+        for message in messages:
+            after_commit(db, lambda value=message.value: callback(value))
+        if any(message.value == "bad" for message in messages):
+            raise ValueError("bad message")
+        return []
+
+    await make_batch_consumer(consumer, make_producer(), handler, session_factory).run_once()
+
+    # The failed batch and the failed retry are rolled back with their callbacks
+    callback.assert_awaited_once_with("good")
+
+
+@pytest.mark.asyncio
+async def test_infrastructure_errors_are_not_skipped():
+    consumer = make_consumer([Message(0, "a")])
+    producer = make_producer()
+
+    async def handler(messages, db):
+        raise OperationalError("SELECT 1", {}, Exception("MySQL server has gone away"))
+
+    with pytest.raises(OperationalError):
+        await make_batch_consumer(consumer, producer, handler).run_once()
+    consumer.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_replies_carry_key_and_correlation_header():
+    consumer = make_consumer([Message(0, "a")])
+    producer = make_producer()
+
+    async def handler(messages, db):
+        return [Reply("replies", {"cognito_id": "abc"}, "request-1", "request-1")]
+
+    await make_batch_consumer(consumer, producer, handler).run_once()
+
+    producer.send.assert_awaited_once_with(
+        "replies", {"cognito_id": "abc"}, key="request-1", headers=[("correlation_id", b"request-1")]
+    )
+
+
+@pytest.mark.asyncio
+async def test_run_restarts_a_failed_consumer(monkeypatch):
+    monkeypatch.setattr("app.services.batch_consumer.KAFKA_RESTART_BACKOFF", 0.01)
+    failing = make_consumer()
+    failing.getmany.side_effect = ConnectionError("broker gone")
+    healthy = make_consumer()
+
+    async def idle_poll(**kwargs):
+        await asyncio.sleep(0.01)
+        return {}
+
+    healthy.getmany.side_effect = idle_poll
+    consumers = [failing, healthy]
+    batch_consumer = BatchConsumer("test", lambda: consumers.pop(0), AsyncMock(), echo_handler)
+
+    task = asyncio.create_task(batch_consumer.run())
+    while batch_consumer.consumer is not healthy:
+        await asyncio.sleep(0.01)
+    batch_consumer.stop()
+    await asyncio.wait_for(task, 1)
+
+    assert batch_consumer.restarts == 1
+    failing.stop.assert_awaited_once()
+    healthy.stop.assert_awaited_once()
+
+
+def test_correlation_id_from_payload_or_header():
+    assert correlation_id_of(Message(0, {"correlation_id": "from-payload"})) == "from-payload"
+    assert correlation_id_of(Message(0, {}, [("correlation_id", b"from-header")])) == "from-header"
+    assert correlation_id_of(Message(0, {})) is None
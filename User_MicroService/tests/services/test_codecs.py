@@ -0,0 +1,66 @@
+import pytest
+from unittest.mock import patch
+from aiokafka.structs import ConsumerRecord
+from app.services import codecs
+from app.services.codecs import Codec, EncodeError, encode_message, decode_message, parse_topic_codecs, codec_for_topic
+
+# A stand-in for a binary codec, so per-topic selection is tested without msgspec or msgpack installed
+REVERSED = Codec("reversed", "application/x-reversed", lambda v: codecs.JSON.encode(v)[::-1], lambda b: codecs.JSON.decode(b[::-1]))
+
+
+@pytest.fixture
+def reversed_topic():
+    with patch.dict(codecs.CODECS, {"reversed": REVERSED}), patch.dict(codecs.topic_codecs, {"binary-topic": "reversed"}):
+        yield "binary-topic"
+
+
+def record(topic, value, headers=()):
+    return ConsumerRecord(topic, 0, 0, 0, 0, None, value, None, len(value), -1, list(headers))
+
+
+def test_json_is_the_default_codec():
+    value, headers = encode_message("replies", {"cognito_id": "abc"}, [("correlation_id", b"1")])
+
+    assert value == b'{"cognito_id":"abc"}'
+    assert headers == [("correlation_id", b"1"), ("content-type", b"application/json")]
+
+
+def test_json_accepts_non_str_keys():
+    # e.g. a tenant data reply for numeric tenant ids
+    value, headers = encode_message("tenant_info_response", {1: None})
+
+    assert value == b'{"1":null}'
+
+
+def test_unencodable_value_raises_encode_error():
+    with pytest.raises(EncodeError, match="replies"):
+        encode_message("replies", {"value": object()})
+
+
+def test_topic_codec_round_trip(reversed_topic):
+    value, headers = encode_message(reversed_topic, {"n": 1})
+
+    assert headers == [("content-type", b"application/x-reversed")]
+    assert decode_message(record(reversed_topic, value, headers)).value == {"n": 1}
+
+
+def test_content_type_header_wins_over_the_topic_codec(reversed_topic):
+    message = record(reversed_topic, b'{"n": 1}', [("content-type", b"application/json")])
+
+    assert decode_message(message).value == {"n": 1}
+
+
+def test_messages_without_header_use_the_topic_codec():
+    assert decode_message(record("replies", b'{"n": 1}')).value == {"n": 1}
+
+
+def test_unavailable_codec_is_reported():
+    with patch.dict(codecs.topic_codecs, {"replies": "missing"}):
+        with pytest.raises(ValueError, match="missing"):
+            codec_for_topic("replies")
+
+
+def test_parse_topic_codecs():
+    assert parse_topic_codecs("user-events:msgpack, replies:json") == {"user-events": "msgpack", "replies": "json"}
+    with pytest.raises(ValueError):
+        parse_topic_codecs("user-events")
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+from unittest.mock import patch
+from app.services import http_client
+
+
+def mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    with patch.object(http_client, "HTTP_BACKOFF", 0):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_get_is_retried_on_server_error():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 3 else 200, json={"keys": []})
+
+    with patch.object(http_client, "_client", mock_client(handler)):
+        response = await http_client.request_with_retry("GET", "https://example.com/jwks.json")
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_post_is_not_retried_after_a_response():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    with patch.object(http_client, "_client", mock_client(handler)):
+        response = await http_client.request_with_retry("POST", "https://example.com/oauth2/token")
+
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_post_is_retried_when_connection_fails():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={})
+
+    with patch.object(http_client, "_client", mock_client(handler)):
+        response = await http_client.request_with_retry("POST", "https://example.com/oauth2/token")
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    with patch.object(http_client, "_client", mock_client(handler)):
+        with pytest.raises(httpx.ConnectError):
+            await http_client.request_with_retry("GET", "https://example.com/jwks.json")
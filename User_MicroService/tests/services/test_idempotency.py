@@ -0,0 +1,101 @@
+import time
+import pytest
+from collections import namedtuple
+from unittest.mock import AsyncMock
+from sqlalchemy import select, func
+from app.models.models import ProcessedRequest
+from app.services.batch_consumer import Reply
+from app.services.idempotency import IdempotencyStore, idempotent, request_key, _utcnow
+
+Message = namedtuple("Message", ["offset", "value", "headers", "topic"], defaults=(None, "requests"))
+
+
+def make_handler():
+    async def handle(messages, db):
+        return [Reply("responses", {"n": message.value["n"]}, None, message.value.get("correlation_id"), message)
+                for message in messages]
+
+    return AsyncMock(side_effect=handle)
+
+
+async def run_after_commit(db):
+    await db.commit()
+    for callback in db.info.pop("after_commit", []):
+        await callback()
+
+
+def test_request_key_prefers_request_ids_over_content():
+    assert request_key(Message(0, {"n": 1, "correlation_id": "c1"})) == request_key(Message(5, {"n": 2, "correlation_id": "c1"}))
+    assert request_key(Message(0, {"n": 1})) == request_key(Message(1, {"n": 1}))
+    assert request_key(Message(0, {"n": 1})) != request_key(Message(0, {"n": 1}, topic="other"))
+
+
+@pytest.mark.asyncio
+async def test_redelivered_request_gets_the_recorded_reply(async_db_session):
+    handler = make_handler()
+    handle = idempotent(handler, IdempotencyStore())
+    message = Message(0, {"n": 1, "correlation_id": "c1"})
+
+    first = await handle([message], async_db_session)
+    await run_after_commit(async_db_session)
+    second = await handle([message._replace(offset=1)], async_db_session)
+
+    assert handler.await_count == 1
+    assert [reply[:4] for reply in second] == [reply[:4] for reply in first]
+    assert second[0].request.offset == 1
+
+
+@pytest.mark.asyncio
+async def test_records_survive_the_memory_front(async_db_session):
+    message = Message(0, {"n": 1})
+    await idempotent(make_handler(), IdempotencyStore())([message], async_db_session)
+    await run_after_commit(async_db_session)
+
+    # A new process starts with an empty LRU and finds the record in the database
+    handler = make_handler()
+    replies = await idempotent(handler, IdempotencyStore())([message], async_db_session)
+
+    handler.assert_not_awaited()
+    assert replies[0].value == {"n": 1}
+    assert await async_db_session.scalar(select(func.count()).select_from(ProcessedRequest)) == 1
+
+
+@pytest.mark.asyncio
+async def test_repeats_within_a_batch_are_handled_once():
+    handler = make_handler()
+    messages = [Message(0, {"n": 1}), Message(1, {"n": 1}), Message(2, {"n": 2})]
+
+    replies = await idempotent(handler, IdempotencyStore(persistent=False))(messages, None)
+
+    assert len(handler.await_args.args[0]) == 2
+    assert [reply.value["n"] for reply in replies] == [1, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_records_do_not_outlive_their_replies(async_db_session):
+    async def handle(messages, db):
+        return [Reply("responses", {"valid": True}, None, None, message, message.value["exp"]) for message in messages]
+
+    store = IdempotencyStore(ttl=60, persistent=False)
+    handler = AsyncMock(side_effect=handle)
+    expiring, expired = Message(0, {"exp": time.time() + 0.05}), Message(1, {"exp": time.time() - 1})
+
+    await idempotent(handler, store)([expiring, expired], None)
+    await idempotent(handler, store)([expiring, expired], None)
+    assert handler.await_count == 2
+    assert handler.await_args.args[0] == [expired]
+
+    time.sleep(0.06)
+    await idempotent(handler, store)([expiring], None)
+    assert handler.await_args.args[0] == [expiring]
+
+
+@pytest.mark.asyncio
+async def test_persistent_record_expiry_is_capped(async_db_session):
+    store = IdempotencyStore(ttl=3600)
+
+    store.record(async_db_session, "key", [["responses", {}, None, None]], expires_at=time.time() + 30)
+    await run_after_commit(async_db_session)
+
+    record = await async_db_session.scalar(select(ProcessedRequest))
+    assert (record.expires_at - _utcnow()).total_seconds() <= 30
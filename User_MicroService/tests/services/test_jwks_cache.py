@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+import threading
+import time
+from unittest.mock import patch, Mock, AsyncMock
+from app.services.jwks_cache import JWKSCache
+
+JWK = {"kid": "test_kid", "kty": "RSA", "alg": "RS256", "use": "sig", "n": "test_n", "e": "AQAB"}
+
+
+def jwks_response(*keys):
+    return Mock(status_code=200, json=lambda: {"keys": list(keys)})
+
+
+@patch("requests.get")
+def test_get_key_fetches_once_then_hits(mock_get):
+    mock_get.return_value = jwks_response(JWK)
+    cache = JWKSCache("https://example.com/jwks.json")
+
+    assert cache.get_key("test_kid") is not None
+    assert cache.get_key("test_kid") is not None
+
+    assert mock_get.call_count == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["refreshes"] == 1
+
+
+@patch("requests.get")
+def test_unknown_kid_refresh_is_rate_limited(mock_get):
+    mock_get.return_value = jwks_response(JWK)
+    cache = JWKSCache("https://example.com/jwks.json", min_refresh_interval=60)
+
+    assert cache.get_key("rotated_kid") is None
+    assert cache.get_key("rotated_kid") is None
+
+    # The second miss happens inside the refresh interval, so it does not refetch
+    assert mock_get.call_count == 1
+
+
+@patch("requests.get")
+def test_unknown_kid_picks_up_rotated_key(mock_get):
+    mock_get.return_value = jwks_response(JWK)
+    cache = JWKSCache("https://example.com/jwks.json", min_refresh_interval=0)
+    cache.get_key("test_kid")
+
+    mock_get.return_value = jwks_response(JWK, {**JWK, "kid": "rotated_kid"})
+
+    assert cache.get_key("rotated_kid") is not None
+    assert mock_get.call_count == 2
+
+
+@patch("requests.get")
+def test_concurrent_misses_share_one_fetch(mock_get):
+    def slow_response(*args, **kwargs):
+        time.sleep(0.1)
+        return jwks_response(JWK)
+
+    mock_get.side_effect = slow_response
+    cache = JWKSCache("https://example.com/jwks.json")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_key("test_kid"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_get.call_count == 1
+    assert all(key is not None for key in results)
+
+
+@patch("requests.get")
+def test_failed_refresh_keeps_previous_keys(mock_get):
+    mock_get.return_value = jwks_response(JWK)
+    cache = JWKSCache("https://example.com/jwks.json")
+    cache.get_key("test_kid")
+
+    mock_get.side_effect = Exception("Cognito unavailable")
+    cache.refresh()
+
+    assert cache.get_key("test_kid") is not None
+    assert cache.stats()["refresh_errors"] == 1
+
+
+@pytest.mark.parametrize("response", [
+    Mock(status_code=503, json=lambda: {"message": "Service unavailable"}),
+    Mock(status_code=200, json=lambda: {"keys": []}),
+])
+@patch("requests.get")
+def test_error_response_keeps_previous_keys(mock_get, response):
+    mock_get.return_value = jwks_response(JWK)
+    cache = JWKSCache("https://example.com/jwks.json")
+    cache.get_key("test_kid")
+    age = cache.stats()["age_seconds"]
+
+    mock_get.return_value = response
+    cache.refresh()
+
+    assert cache.get_key("test_kid") is not None
+    assert cache.stats()["keys"] == 1
+    assert cache.stats()["refreshes"] == 1
+    assert cache.stats()["refresh_errors"] == 1
+    assert cache.stats()["age_seconds"] >= age
+
+
+@pytest.mark.asyncio
+@patch("app.services.jwks_cache.request_with_retry", new_callable=AsyncMock)
+async def test_async_error_response_keeps_previous_keys(mock_request):
+    mock_request.return_value = jwks_response(JWK)
+    cache = JWKSCache("https://example.com/jwks.json")
+    await cache.aget_key("test_kid")
+
+    mock_request.return_value = Mock(status_code=503, json=lambda: {"message": "Service unavailable"})
+    await cache.arefresh()
+
+    assert await cache.aget_key("test_kid") is not None
+    assert cache.stats()["refresh_errors"] == 1
+
+
+@pytest.mark.asyncio
+@patch("app.services.jwks_cache.request_with_retry", new_callable=AsyncMock)
+async def test_async_misses_share_one_fetch(mock_request):
+    async def slow_response(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return jwks_response(JWK)
+
+    mock_request.side_effect = slow_response
+    cache = JWKSCache("https://example.com/jwks.json")
+
+    keys = await asyncio.gather(*(cache.aget_key("test_kid") for _ in range(8)))
+
+    assert mock_request.call_count == 1
+    assert all(key is not None for key in keys)
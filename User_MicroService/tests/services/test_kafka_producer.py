@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from app.services.kafka_producer import ReplyProducer
+from app.services.codecs import encode_message
+
+
+async def make_producer(encoder=None):
+    futures = []
+    kafka_producer = AsyncMock()
+
+    async def send(*args, **kwargs):
+        futures.append(asyncio.get_running_loop().create_future())
+        return futures[-1]
+
+    kafka_producer.send.side_effect = send
+    producer = ReplyProducer(producer_factory=lambda: kafka_producer, encoder=encoder)
+    await producer.start()
+    return producer, kafka_producer, futures
+
+
+@pytest.mark.asyncio
+async def test_delivery_is_counted_on_acknowledgement():
+    producer, kafka_producer, futures = await make_producer()
+
+    await producer.send("replies", {"cognito_id": "abc"}, key="abc")
+    assert producer.stats()["pending"] == 1
+
+    futures[0].set_result("metadata")
+    await asyncio.sleep(0)
+
+    stats = producer.stats()
+    assert stats["pending"] == 0
+    assert stats["delivered"] == 1
+    assert stats["errors"] == 0
+    kafka_producer.send.assert_awaited_once_with("replies", {"cognito_id": "abc"}, key="abc", headers=None)
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_is_counted_per_topic():
+    producer, kafka_producer, futures = await make_producer()
+
+    await producer.send("replies", {})
+    await producer.send("replies", {})
+    futures[0].set_result("metadata")
+    futures[1].set_exception(Exception("broker unavailable"))
+    await asyncio.sleep(0)
+
+    stats = producer.stats()
+    assert stats["delivered"] == 1
+    assert stats["errors"] == 1
+    assert stats["errors_by_topic"] == {"replies": 1}
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_before_stopping():
+    producer, kafka_producer, futures = await make_producer()
+
+    await producer.close()
+
+    assert [name for name, *_ in kafka_producer.mock_calls] == ["start", "flush", "stop"]
+    assert not producer.started
+
+
+@pytest.mark.asyncio
+async def test_send_before_start_fails():
+    producer = ReplyProducer(producer_factory=AsyncMock)
+
+    with pytest.raises(RuntimeError):
+        await producer.send("replies", {})
+
+
+@pytest.mark.asyncio
+async def test_values_are_encoded_per_topic():
+    producer, kafka_producer, futures = await make_producer(encoder=encode_message)
+
+    await producer.send("replies", {"cognito_id": "abc"}, key="abc")
+
+    kafka_producer.send.assert_awaited_once_with(
+        "replies", b'{"cognito_id":"abc"}', key="abc", headers=[("content-type", b"application/json")]
+    )
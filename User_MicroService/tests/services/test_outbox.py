@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy import select, func
+from app.models.models import User, OutboxEvent
+from app.services.outbox import OutboxRelay, add_event, add_user_event, USER_EVENTS_TOPIC, USER_UPDATED
+from tests.conftest import AsyncTestingSessionLocal
+
+
+def make_producer(error=None):
+    async def send(topic, value, key=None, headers=None):
+        future = asyncio.get_running_loop().create_future()
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
+        return future
+
+    return AsyncMock(send=AsyncMock(side_effect=send))
+
+
+async def count_events(db):
+    return await db.scalar(select(func.count()).select_from(OutboxEvent))
+
+
+@pytest.mark.asyncio
+async def test_user_event_carries_the_user_record(async_db_session):
+    user = User(id=1, cognito_id="test_cognito_id", name="Test User", email="testuser@example.com", role="tenant")
+    add_user_event(async_db_session, USER_UPDATED, user)
+    await async_db_session.commit()
+
+    event = await async_db_session.scalar(select(OutboxEvent))
+    assert (event.topic, event.key) == (USER_EVENTS_TOPIC, "test_cognito_id")
+    assert event.payload["type"] == USER_UPDATED
+    assert event.payload["user"]["email"] == "testuser@example.com"
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_in_order_and_deletes_the_batch(async_db_session):
+    for i in range(3):
+        add_event(async_db_session, "topic", {"n": i}, key="k")
+    await async_db_session.commit()
+    producer = make_producer()
+    relay = OutboxRelay(producer, AsyncTestingSessionLocal, batch_size=2)
+
+    assert await relay.relay_once() == 2
+    assert await relay.relay_once() == 1
+    assert await relay.relay_once() == 0
+
+    assert [c.args for c in producer.send.call_args_list] == [("topic", {"n": i}) for i in range(3)]
+    assert await count_events(async_db_session) == 0
+    assert relay.stats()["published"] == 3
+
+
+@pytest.mark.asyncio
+async def test_undelivered_batch_stays_in_the_outbox(async_db_session):
+    add_event(async_db_session, "topic", {"n": 0})
+    await async_db_session.commit()
+    relay = OutboxRelay(make_producer(ConnectionError("broker down")), AsyncTestingSessionLocal)
+
+    with pytest.raises(ConnectionError):
+        await relay.relay_once()
+
+    assert await count_events(async_db_session) == 1
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_changes_publish_nothing(async_db_session):
+    add_event(async_db_session, "topic", {"n": 0})
+    await async_db_session.rollback()
+
+    assert await count_events(async_db_session) == 0
@@ -0,0 +1,108 @@
+import json
+import base64
+import pytest
+from unittest.mock import patch
+from app.models.models import User
+from app.services.session_tokens import SessionKeyring, SessionTokenError, issue_session_token, \
+    verify_session_token, parse_signing_keys, user_from_claims, _sign
+
+
+def make_user():
+    return User(id=7, cognito_id="test_cognito_id", name="Test User", email="testuser@example.com", role="tenant")
+
+
+def test_session_token_round_trip():
+    keyring = SessionKeyring()
+
+    claims = verify_session_token(issue_session_token(make_user(), keyring), keyring)
+    user = user_from_claims(claims)
+
+    assert claims["sub"] == "test_cognito_id"
+    assert (user.id, user.cognito_id, user.name, user.email, user.role) == \
+        (7, "test_cognito_id", "Test User", "testuser@example.com", "tenant")
+
+
+def test_tampered_session_token_is_rejected():
+    keyring = SessionKeyring()
+    header, claims, signature = issue_session_token(make_user(), keyring).split(".")
+    forged = base64.urlsafe_b64encode(b'{"sub":"other","role":"landlord","iss":"user-service","exp":9999999999}')
+
+    with pytest.raises(SessionTokenError, match="signature"):
+        verify_session_token(f"{header}.{forged.rstrip(b'=').decode()}.{signature}", keyring)
+
+
+@pytest.mark.parametrize("token", ["", "not-a-token", "a.b.c", None])
+def test_malformed_session_token_is_rejected(token):
+    with pytest.raises(SessionTokenError):
+        verify_session_token(token, SessionKeyring())
+
+
+def encode_part(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+@pytest.mark.parametrize("header", [b'{"alg":"HS256","kid":["x"]}', b'{"alg":"HS256","kid":{}}', b'{"alg":"HS256"}'])
+def test_session_token_with_unusable_kid_is_rejected(header):
+    keyring = SessionKeyring()
+    _, claims, signature = issue_session_token(make_user(), keyring).split(".")
+
+    with pytest.raises(SessionTokenError):
+        verify_session_token(f"{encode_part(header)}.{claims}.{signature}", keyring)
+
+
+@pytest.mark.parametrize("claims", [b'["user-service"]', b'"user-service"', b'{"iss":"user-service","exp":"never"}'])
+def test_signed_session_token_with_unusable_claims_is_rejected(claims):
+    keyring = SessionKeyring()
+    kid, secret = keyring.signing_key()
+    header = json.dumps({"alg": "HS256", "kid": kid}).encode()
+    signing_input = f"{encode_part(header)}.{encode_part(claims)}"
+    signature = encode_part(_sign(secret, signing_input.encode()))
+
+    with pytest.raises(SessionTokenError):
+        verify_session_token(f"{signing_input}.{signature}", keyring)
+
+
+def test_expired_session_token_is_rejected():
+    keyring = SessionKeyring()
+
+    with pytest.raises(SessionTokenError, match="expired"):
+        verify_session_token(issue_session_token(make_user(), keyring, ttl=-1), keyring)
+
+
+def test_token_from_another_keyring_is_rejected():
+    with pytest.raises(SessionTokenError, match="Unknown"):
+        verify_session_token(issue_session_token(make_user(), SessionKeyring()), SessionKeyring())
+
+
+def test_retired_key_verifies_until_the_overlap_ends():
+    keyring = SessionKeyring(overlap=60)
+    token = issue_session_token(make_user(), keyring)
+
+    with patch("app.services.session_tokens.time.monotonic", return_value=1000.0):
+        keyring.rotate()
+        assert verify_session_token(token, keyring)["sub"] == "test_cognito_id"
+    with patch("app.services.session_tokens.time.monotonic", return_value=1061.0):
+        with pytest.raises(SessionTokenError, match="Unknown"):
+            verify_session_token(token, keyring)
+
+
+def test_signing_rotates_after_the_interval():
+    keyring = SessionKeyring(rotation_interval=0)
+    first_kid = keyring.active_kid
+
+    issue_session_token(make_user(), keyring)
+
+    assert keyring.active_kid != first_kid
+
+
+def test_configured_keys_sign_with_the_first_and_verify_with_all():
+    old = SessionKeyring(parse_signing_keys("old:" + base64.b64encode(b"o" * 32).decode()))
+    keys = parse_signing_keys("new:" + base64.b64encode(b"n" * 32).decode() + ",old:" + base64.b64encode(b"o" * 32).decode())
+    keyring = SessionKeyring(keys, rotation_interval=0)
+
+    token = issue_session_token(make_user(), keyring)
+
+    assert keyring.active_kid == "new" and not keyring.rotating
+    assert verify_session_token(issue_session_token(make_user(), old), keyring)["sub"] == "test_cognito_id"
+    with pytest.raises(SessionTokenError):
+        verify_session_token(token, old)
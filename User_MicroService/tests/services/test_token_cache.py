@@ -0,0 +1,55 @@
+import time
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.services.token_cache import TokenCache
+from app.services.auth_service import validate_access_token_async
+
+
+def test_put_and_get_until_exp():
+    cache = TokenCache()
+    payload = {"sub": "test_cognito_id", "exp": time.time() + 60}
+    cache.put("test_token", payload)
+
+    assert cache.get("test_token") == payload
+    assert cache.get("other_token") is None
+
+
+def test_expired_entry_is_not_served():
+    cache = TokenCache()
+    cache.put("test_token", {"sub": "test_cognito_id", "exp": time.time() + 60})
+
+    with patch("app.services.token_cache.time.time", return_value=time.time() + 120):
+        assert cache.get("test_token") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_tokens_without_exp_are_not_cached():
+    cache = TokenCache()
+    cache.put("test_token", {"sub": "test_cognito_id"})
+
+    assert cache.get("test_token") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TokenCache(max_entries=2)
+    exp = time.time() + 60
+    cache.put("token_a", {"sub": "a", "exp": exp})
+    cache.put("token_b", {"sub": "b", "exp": exp})
+    cache.get("token_a")
+    cache.put("token_c", {"sub": "c", "exp": exp})
+
+    assert cache.get("token_b") is None
+    assert cache.get("token_a")["sub"] == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+@patch("app.services.auth_service.decode_jwt_async", new_callable=AsyncMock)
+async def test_validate_access_token_verifies_once(mock_decode_jwt):
+    mock_decode_jwt.return_value = {"sub": "test_cognito_id", "exp": time.time() + 60}
+
+    await validate_access_token_async("test_token")
+    payload = await validate_access_token_async("test_token")
+
+    assert payload["sub"] == "test_cognito_id"
+    mock_decode_jwt.assert_awaited_once_with("test_token", "test_token")
@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import patch
+from app.models.models import User
+from app.services.user_cache import MemoryUserCache, UserCache, create_user_cache
+
+
+def make_user(cognito_id="test_cognito_id", role="user"):
+    return User(id=1, cognito_id=cognito_id, name="Test User", email="testuser@example.com", role=role)
+
+
+@pytest.mark.asyncio
+async def test_set_and_get_user():
+    cache = MemoryUserCache()
+    await cache.set(make_user())
+
+    user = await cache.get_user("test_cognito_id")
+
+    assert isinstance(user, User)
+    assert (user.id, user.email, user.role) == (1, "testuser@example.com", "user")
+    assert await cache.get("other_cognito_id") is None
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl():
+    cache = MemoryUserCache(ttl=60)
+    await cache.set(make_user())
+
+    with patch("app.services.user_cache.time.monotonic", return_value=10 ** 9):
+        assert await cache.get("test_cognito_id") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entry_is_evicted():
+    cache = MemoryUserCache(max_entries=2)
+    await cache.set(make_user("a"))
+    await cache.set(make_user("b"))
+    await cache.get("a")
+    await cache.set(make_user("c"))
+
+    assert set(await cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_delete_and_update():
+    cache = MemoryUserCache()
+    await cache.set_many([make_user("a"), make_user("b")])
+
+    await cache.delete("a")
+    await cache.set(make_user("b", role="tenant"))
+
+    assert await cache.get("a") is None
+    assert (await cache.get("b"))["role"] == "tenant"
+
+
+@pytest.mark.asyncio
+async def test_disabled_backend_caches_nothing():
+    cache = create_user_cache("none")
+    await cache.set(make_user())
+
+    assert type(cache) is UserCache
+    assert await cache.get_user("test_cognito_id") is None
@@ -0,0 +1,47 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import inspect
+from app.models.models import User
+from app.services.user_queries import UserRow, get_user_row, get_user_rows, email_exists
+
+
+@pytest_asyncio.fixture
+async def users(async_db_session):
+    async_db_session.add_all([
+        User(cognito_id=f"tenant_{i}", name=f"Tenant {i}", email=f"tenant{i}@example.com", role="tenant")
+        for i in range(3)
+    ])
+    await async_db_session.commit()
+    async_db_session.expunge_all()
+
+
+@pytest.mark.asyncio
+async def test_get_user_row_returns_columns_without_orm_state(async_db_session, users):
+    row = await get_user_row(async_db_session, "tenant_1")
+
+    assert row == UserRow(row.id, "tenant_1", "Tenant 1", "tenant1@example.com", "tenant")
+    assert len(async_db_session.identity_map) == 0
+    assert await get_user_row(async_db_session, "unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_user_row_converts_to_a_detached_user(async_db_session, users):
+    user = (await get_user_row(async_db_session, "tenant_0")).to_user()
+
+    assert inspect(user).detached
+    merged = await async_db_session.merge(user)
+    assert merged.email == "tenant0@example.com"
+
+
+@pytest.mark.asyncio
+async def test_get_user_rows_skips_unknown_ids(async_db_session, users):
+    rows = await get_user_rows(async_db_session, ["tenant_0", "unknown", "tenant_2"])
+
+    assert sorted(row.cognito_id for row in rows) == ["tenant_0", "tenant_2"]
+    assert await get_user_rows(async_db_session, []) == []
+
+
+@pytest.mark.asyncio
+async def test_email_exists(async_db_session, users):
+    assert await email_exists(async_db_session, "tenant2@example.com") is True
+    assert await email_exists(async_db_session, "nobody@example.com") is False
@@ -0,0 +1,185 @@
+import pytest
+from datetime import timedelta
+from sqlalchemy import event
+from app.models.models import User, OutboxEvent
+from sqlalchemy import select
+from app.services.user_service import get_tenants_data, create_users, iter_user_export, export_watermark
+from app.services.user_cache import user_cache
+
+
+async def add_tenants(db_session, count):
+    for i in range(count):
+        db_session.add(User(cognito_id=f"tenant_{i}", name=f"Tenant {i}", email=f"tenant{i}@example.com", role="tenant"))
+    await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_get_tenants_data(async_db_session):
+    await add_tenants(async_db_session, 2)
+
+    tenant_data = await get_tenants_data(async_db_session, ["tenant_0", "tenant_1"])
+
+    assert tenant_data == {
+        "tenant_0": ["Tenant 0", "tenant0@example.com"],
+        "tenant_1": ["Tenant 1", "tenant1@example.com"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_tenants_data_answers_numeric_ids_by_their_string_form(async_db_session):
+    async_db_session.add(User(cognito_id="5", name="Numeric", email="numeric@example.com", role="tenant"))
+    await async_db_session.commit()
+
+    first = await get_tenants_data(async_db_session, [5])
+    # The second lookup is answered from the user cache
+    second = await get_tenants_data(async_db_session, [5, "5"])
+
+    assert first == second == {"5": ["Numeric", "numeric@example.com"]}
+
+
+@pytest.mark.asyncio
+async def test_get_tenants_data_reports_missing_ids(async_db_session):
+    await add_tenants(async_db_session, 1)
+
+    tenant_data = await get_tenants_data(async_db_session, ["tenant_0", "unknown_tenant"])
+
+    assert tenant_data["tenant_0"] == ["Tenant 0", "tenant0@example.com"]
+    assert tenant_data["unknown_tenant"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_tenants_data_queries_once_per_chunk(async_db_session):
+    await add_tenants(async_db_session, 5)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    sync_engine = async_db_session.get_bind()
+    event.listen(sync_engine, "before_cursor_execute", listener)
+
+    try:
+        tenant_data = await get_tenants_data(async_db_session, [f"tenant_{i}" for i in range(5)], chunk_size=2)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert len(tenant_data) == 5
+    assert len(statements) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_tenants_data_skips_cached_tenants(async_db_session):
+    await add_tenants(async_db_session, 2)
+    await get_tenants_data(async_db_session, ["tenant_0"])
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    sync_engine = async_db_session.get_bind()
+    event.listen(sync_engine, "before_cursor_execute", listener)
+
+    try:
+        tenant_data = await get_tenants_data(async_db_session, ["tenant_0", "tenant_1"])
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert tenant_data["tenant_0"] == ["Tenant 0", "tenant0@example.com"]
+    assert tenant_data["tenant_1"] == ["Tenant 1", "tenant1@example.com"]
+    assert len(statements) == 1
+    assert user_cache.stats()["hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_create_users_reports_created_and_existing(async_db_session):
+    await add_tenants(async_db_session, 1)
+    users = [
+        {"name": "New User", "email": "new@example.com"},
+        {"name": "Tenant 0", "email": "tenant0@example.com", "cognito_id": "other_id"},
+        {"name": "New User again", "email": "new@example.com"},
+    ]
+
+    results = await create_users(async_db_session, users)
+    await async_db_session.commit()
+
+    assert [result["status"] for result in results] == ["created", "existing", "created"]
+    events = (await async_db_session.execute(select(OutboxEvent))).scalars().all()
+    assert [(event.payload["type"], event.key) for event in events] == [("user.created", results[0]["cognito_id"])]
+    assert results[1]["cognito_id"] == "tenant_0"
+    assert results[0] == results[2]
+    stored = await async_db_session.scalar(select(User).where(User.email == "new@example.com"))
+    assert stored.cognito_id == results[0]["cognito_id"]
+    assert stored.name == "New User"
+
+
+@pytest.mark.asyncio
+async def test_create_users_with_role_updates_existing_users(async_db_session):
+    async_db_session.add(User(cognito_id="landlord_id", name="Landlord", email="landlord@example.com", role="landlord"))
+    await async_db_session.commit()
+
+    results = await create_users(async_db_session, [{"name": "Landlord", "email": "landlord@example.com"}], role="tenant")
+    await async_db_session.commit()
+
+    assert results == [{"email": "landlord@example.com", "cognito_id": "landlord_id", "status": "existing"}]
+    event = await async_db_session.scalar(select(OutboxEvent))
+    assert (event.payload["type"], event.payload["user"]["role"]) == ("user.updated", "tenant")
+    async_db_session.expire_all()
+    user = await async_db_session.scalar(select(User).where(User.email == "landlord@example.com"))
+    assert user.role == "tenant"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("role", [None, "tenant"])
+async def test_create_users_rejects_cognito_ids_of_other_users(async_db_session, role):
+    async_db_session.add(User(cognito_id="landlord_id", name="Landlord", email="landlord@example.com", role="landlord"))
+    await async_db_session.commit()
+    users = [
+        {"name": "Taken", "email": "taken@example.com", "cognito_id": "landlord_id"},
+        {"name": "First", "email": "first@example.com", "cognito_id": "shared_id"},
+        {"name": "Second", "email": "second@example.com", "cognito_id": "shared_id"},
+        {"name": "Landlord", "email": "landlord@example.com", "cognito_id": "shared_id"},
+    ]
+
+    results = await create_users(async_db_session, users, role=role)
+    await async_db_session.commit()
+
+    assert [(result["cognito_id"], result["status"]) for result in results] == [
+        (None, "conflict"), ("shared_id", "created"), (None, "conflict"), ("landlord_id", "existing"),
+    ]
+    async_db_session.expire_all()
+    landlord = await async_db_session.scalar(select(User).where(User.cognito_id == "landlord_id"))
+    assert (landlord.email, landlord.role) == ("landlord@example.com", role or "landlord")
+    emails = (await async_db_session.execute(select(User.email).order_by(User.id))).scalars().all()
+    assert emails == ["landlord@example.com", "first@example.com"]
+
+
+@pytest.mark.asyncio
+async def test_create_users_costs_a_fixed_number_of_statements_per_chunk(async_db_session):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    sync_engine = async_db_session.get_bind()
+    event.listen(sync_engine, "before_cursor_execute", listener)
+
+    try:
+        users = [{"name": f"User {i}", "email": f"user{i}@example.com"} for i in range(10)]
+        results = await create_users(async_db_session, users, chunk_size=5)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert all(result["status"] == "created" for result in results)
+    # Lookup, upsert and read-back for each of the two chunks
+    assert len(statements) == 6
+
+
+@pytest.mark.asyncio
+async def test_iter_user_export_yields_bounded_batches(async_db_session):
+    await add_tenants(async_db_session, 5)
+    until = await export_watermark(async_db_session, lag=0) + timedelta(seconds=1)
+
+    batches = [batch async for batch in iter_user_export(async_db_session, until, batch_size=2)]
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert set(batches[0][0]) == {"id", "cognito_id", "name", "email", "role", "updated_at"}
+
+
+@pytest.mark.asyncio
+async def test_export_watermark_trails_the_database_clock(async_db_session):
+    now = await export_watermark(async_db_session, lag=0)
+
+    watermark = await export_watermark(async_db_session, lag=60)
+
+    assert timedelta(seconds=59) <= now - watermark <= timedelta(seconds=61)
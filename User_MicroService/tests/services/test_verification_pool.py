@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from concurrent.futures.process import BrokenProcessPool
+from jose import JWTError
+from app.services.auth_service import jwks_cache
+from app.services.verification_pool import VerificationPool
+from benchmarks.cognito_stub import CognitoStub
+
+
+@pytest.fixture
+def pool():
+    pool = VerificationPool(kind="thread", workers=4, max_pending=4)
+    yield pool
+    pool.shutdown()
+
+
+def verified(access_tokens, kid):
+    return [({"sub": token, "exp": time.time() + 60}, None) for token in access_tokens]
+
+
+@pytest.mark.asyncio
+@patch("app.services.verification_pool.token_kid", side_effect=lambda token: token[0])
+@patch("app.services.verification_pool.decode_jwts")
+async def test_results_keep_request_order(mock_decode_jwts, mock_token_kid):
+    pool = VerificationPool(kind="thread", workers=4, max_pending=4, group_size=1)
+
+    def decode(access_tokens, kid):
+        # Later tokens finish first
+        time.sleep(0.01 * (5 - int(access_tokens[0])))
+        return verified(access_tokens, kid)
+
+    mock_decode_jwts.side_effect = decode
+
+    results = await pool.verify_tokens(["0", "1", "2", "3", "4"])
+    pool.shutdown()
+
+    assert [payload["sub"] for payload, error in results] == ["0", "1", "2", "3", "4"]
+
+
+@pytest.mark.asyncio
+@patch("app.services.verification_pool.token_kid", return_value="kid")
+@patch("app.services.verification_pool.decode_jwts")
+async def test_errors_are_returned_per_token(mock_decode_jwts, mock_token_kid, pool):
+    mock_decode_jwts.return_value = [({"sub": "good"}, None), (None, "Public key not found")]
+
+    results = await pool.verify_tokens(["good", "bad"])
+
+    assert results == [({"sub": "good"}, None), (None, "Public key not found")]
+
+
+@pytest.mark.asyncio
+@patch("app.services.verification_pool.token_kid", side_effect=JWTError("Error decoding token headers."))
+@patch("app.services.verification_pool.decode_jwts")
+async def test_malformed_tokens_fail_without_reaching_the_pool(mock_decode_jwts, mock_token_kid, pool):
+    results = await pool.verify_tokens(["not-a-jwt"])
+
+    assert results[0][0] is None
+    assert isinstance(results[0][1], JWTError)
+    mock_decode_jwts.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("app.services.verification_pool.token_kid", side_effect=lambda token: token.split(".")[0])
+@patch("app.services.verification_pool.decode_jwts", side_effect=verified)
+async def test_tokens_are_verified_in_groups_by_kid(mock_decode_jwts, mock_token_kid):
+    pool = VerificationPool(kind="thread", workers=2, max_pending=4, group_size=2)
+
+    results = await pool.verify_tokens(["a.1", "b.1", "a.2", "a.3", "a.1"])
+    pool.shutdown()
+
+    assert [payload["sub"] for payload, error in results] == ["a.1", "b.1", "a.2", "a.3", "a.1"]
+    # Duplicates are verified once, and no job mixes keys or exceeds the group size
+    calls = sorted((call.args[1], call.args[0]) for call in mock_decode_jwts.call_args_list)
+    assert calls == [("a", ["a.1", "a.2"]), ("a", ["a.3"]), ("b", ["b.1"])]
+
+
+@pytest.mark.asyncio
+@patch("app.services.verification_pool.token_kid", return_value="kid")
+@patch("app.services.verification_pool.decode_jwts", side_effect=verified)
+async def test_cached_tokens_skip_the_pool(mock_decode_jwts, mock_token_kid, pool):
+    await pool.verify_tokens(["test_token"])
+    await pool.verify_tokens(["test_token"])
+
+    mock_decode_jwts.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_submit_waits_when_saturated():
+    pool = VerificationPool(kind="thread", workers=1, max_pending=1)
+    release = threading.Event()
+    await pool.submit(release.wait)
+
+    second = asyncio.ensure_future(pool.submit(lambda: None))
+    await asyncio.sleep(0.05)
+    assert not second.done()
+
+    release.set()
+    await asyncio.wait_for(second, 1)
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_survives_invalid_tokens():
+    stub = CognitoStub()
+    # Forked workers inherit the seeded keys
+    jwks_cache._store(jwks_cache._parse(stub.jwks["keys"]))
+    header, claims, signature = stub.access_token("tampered_sub").split(".")
+    tampered = f"{header}.{claims}.{signature[:-6]}AAAAAA"
+    pool = VerificationPool(kind="process", workers=1, max_pending=2)
+    try:
+        results = await pool.verify_tokens([stub.access_token("good_sub"), tampered])
+        later = await pool.verify_tokens([stub.access_token("later_sub")])
+    finally:
+        pool.shutdown()
+
+    assert results[0][0]["sub"] == "good_sub"
+    assert results[1] == (None, "Token is invalid")
+    assert later[0][0]["sub"] == "later_sub"
+    assert pool.restarts == 0
+
+
+@pytest.mark.asyncio
+async def test_broken_process_pool_is_replaced():
+    pool = VerificationPool(kind="process", workers=1, max_pending=2)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            await (await pool.submit(os._exit, 1))
+        await asyncio.sleep(0)
+
+        assert await (await pool.submit(abs, -1)) == 1
+        assert pool.restarts == 1
+    finally:
+        pool.shutdown()
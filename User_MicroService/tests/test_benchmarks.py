@@ -0,0 +1,65 @@
+import json
+import pytest
+from jose import jws, jwt
+from benchmarks.cognito_stub import CognitoStub
+from benchmarks.fake_kafka import FakeBroker
+from benchmarks.run import compare
+from benchmarks.scenarios import summarize
+
+BASELINE = {"GET /users": {"p50_ms": 10.0, "p99_ms": 20.0, "throughput": 100.0}}
+
+
+def test_compare_accepts_results_within_tolerance():
+    results = {"GET /users": {"p50_ms": 12.0, "p99_ms": 29.0, "throughput": 80.0}}
+
+    assert compare(results, BASELINE, tolerance=0.25, p99_tolerance=0.5) == []
+
+
+def test_compare_reports_each_regressed_metric():
+    results = {"GET /users": {"p50_ms": 13.0, "p99_ms": 31.0, "throughput": 70.0}}
+
+    regressions = compare(results, BASELINE, tolerance=0.25, p99_tolerance=0.5)
+
+    assert [r.split()[2] for r in regressions] == ["p50_ms", "p99_ms", "throughput"]
+
+
+def test_compare_ignores_scenarios_without_a_baseline():
+    results = {"GET /callback": {"p50_ms": 1000.0, "p99_ms": 1000.0, "throughput": 1.0}}
+
+    assert compare(results, BASELINE, tolerance=0.25, p99_tolerance=0.5) == []
+
+
+def test_summarize_reports_per_operation_throughput():
+    summary = summarize([0.1] * 10, operations_per_sample=50)
+
+    assert summary["p50_ms"] == pytest.approx(100.0)
+    assert summary["throughput"] == pytest.approx(500.0)
+
+
+@pytest.mark.asyncio
+async def test_fake_consumer_resumes_from_committed_offsets():
+    broker = FakeBroker()
+    for i in range(5):
+        broker.produce("validation", {"n": i})
+
+    consumer = broker.consumer("validation", "group")
+    await consumer.start()
+    batch = await consumer.getmany(max_records=3)
+    await consumer.commit()
+
+    restarted = broker.consumer("validation", "group")
+    await restarted.start()
+    rest = await restarted.getmany()
+
+    assert [r.value["n"] for records in batch.values() for r in records] == [0, 1, 2]
+    assert [r.value["n"] for records in rest.values() for r in records] == [3, 4]
+
+
+def test_cognito_stub_signs_tokens_verifiable_with_its_jwks():
+    stub = CognitoStub()
+    token = stub.access_token("some-sub")
+
+    claims = json.loads(jws.verify(token, stub.jwks, algorithms=["RS256"]))
+
+    assert claims["sub"] == "some-sub"
+    assert jwt.get_unverified_header(token)["kid"] == stub.kid
@@ -0,0 +1,167 @@
+import pytest
+from collections import namedtuple
+from unittest.mock import patch, Mock, AsyncMock
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from app.main import handle_user_creation, handle_tenant_data, process_validation_request
+from app.services.batch_consumer import Reply
+from app.models.models import User, OutboxEvent
+from app.services.user_cache import user_cache
+
+Message = namedtuple("Message", ["offset", "value", "headers"], defaults=(None,))
+
+
+def create_user_message(offset, email):
+    return Message(offset, {"action": "create_user", "user_data": {"name": "Tenant User", "email": email}})
+
+
+@pytest.mark.asyncio
+async def test_handle_user_creation_deduplicates_within_a_batch(async_db_session):
+    messages = [create_user_message(0, "tenant@example.com"), create_user_message(1, "tenant@example.com")]
+
+    replies = await handle_user_creation(messages, async_db_session)
+    await async_db_session.commit()
+
+    assert len(replies) == 2
+    assert replies[0].value == replies[1].value
+    count = await async_db_session.scalar(select(func.count()).select_from(User).where(User.email == "tenant@example.com"))
+    assert count == 1
+
+
+@pytest.mark.asyncio
+async def test_handle_user_creation_turns_existing_user_into_tenant(async_db_session):
+    async_db_session.add(User(cognito_id="existing_cognito_id", name="Existing", email="existing@example.com", role="landlord"))
+    await async_db_session.commit()
+
+    message = create_user_message(0, "existing@example.com")
+    replies = await handle_user_creation([message], async_db_session)
+    await async_db_session.commit()
+
+    assert replies == [Reply("user-creation-response", {"cognito_id": "existing_cognito_id", "correlation_id": None}, "existing_cognito_id", None, message)]
+    user = await async_db_session.scalar(select(User).where(User.email == "existing@example.com"))
+    assert user.role == "tenant"
+
+
+async def user_event_types(db):
+    return [payload["type"] for payload in (await db.execute(select(OutboxEvent.payload).order_by(OutboxEvent.id))).scalars()]
+
+
+@pytest.mark.asyncio
+async def test_handle_user_creation_announces_only_changes(async_db_session):
+    async_db_session.add(User(cognito_id="landlord_id", name="Landlord", email="landlord@example.com", role="landlord"))
+    async_db_session.add(User(cognito_id="tenant_id", name="Tenant", email="tenant@example.com", role="tenant"))
+    await async_db_session.commit()
+    messages = [create_user_message(0, "new@example.com"), create_user_message(1, "landlord@example.com"),
+                create_user_message(2, "tenant@example.com")]
+
+    await handle_user_creation(messages, async_db_session)
+    await async_db_session.commit()
+
+    assert await user_event_types(async_db_session) == ["user.created", "user.updated"]
+
+
+@pytest.mark.asyncio
+async def test_handle_user_creation_invalidates_cached_user_after_commit(async_db_session):
+    user = User(cognito_id="existing_cognito_id", name="Existing", email="existing@example.com", role="landlord")
+    async_db_session.add(user)
+    await async_db_session.commit()
+    await user_cache.set(user)
+
+    await handle_user_creation([create_user_message(0, "existing@example.com")], async_db_session)
+
+    # Still cached until the batch commits and runs its callbacks
+    assert await user_cache.get("existing_cognito_id") is not None
+    for callback in async_db_session.info.pop("after_commit"):
+        await callback()
+    assert await user_cache.get("existing_cognito_id") is None
+
+
+@pytest.mark.asyncio
+async def test_handle_user_creation_echoes_correlation_id(async_db_session):
+    message = create_user_message(0, "tenant@example.com")
+    message.value["correlation_id"] = "request-1"
+
+    [reply] = await handle_user_creation([message], async_db_session)
+
+    assert reply.key == "request-1"
+    assert reply.correlation_id == "request-1"
+    assert reply.value["correlation_id"] == "request-1"
+
+
+@pytest.mark.asyncio
+async def test_handle_user_creation_creates_users_in_bulk(async_db_session):
+    async_db_session.add(User(cognito_id="existing_cognito_id", name="Existing", email="existing@example.com", role="landlord"))
+    await async_db_session.commit()
+    users = [{"name": "Existing", "email": "existing@example.com"}, {"name": "New", "email": "new@example.com"}]
+
+    replies = await handle_user_creation([Message(0, {"action": "create_users", "users": users, "correlation_id": "c1"})], async_db_session)
+    await async_db_session.commit()
+
+    assert len(replies) == 1
+    assert replies[0].key == "c1"
+    assert [result["status"] for result in replies[0].value["users"]] == ["existing", "created"]
+    async_db_session.expire_all()
+    roles = (await async_db_session.execute(select(User.role))).scalars().all()
+    assert roles == ["tenant", "tenant"]
+
+
+@pytest.mark.asyncio
+async def test_handle_tenant_data(async_db_session):
+    async_db_session.add(User(cognito_id="tenant_id", name="Tenant User", email="tenant@example.com", role="tenant"))
+    await async_db_session.commit()
+
+    request = {"action": "get_tenants_data", "tenant_ids": ["tenant_id"], "correlation_id": "request-1"}
+    message = Message(0, request)
+    replies = await handle_tenant_data([message], async_db_session)
+
+    assert replies == [Reply("tenant_info_response", {"tenant_id": ["Tenant User", "tenant@example.com"]}, "request-1", "request-1", message)]
+
+
+@pytest.mark.asyncio
+@patch("app.main.get_verification_pool")
+async def test_process_validation_request_verifies_the_whole_batch_at_once(mock_get_pool):
+    invalid = HTTPException(status_code=401, detail="Token is invalid")
+    pool = mock_get_pool.return_value = Mock(verify_tokens=AsyncMock(return_value=[
+        ({"sub": "single"}, None),
+        ({"sub": "first"}, None),
+        (None, invalid),
+    ]))
+    single = Message(0, {"action": "validate_token", "access_token": "t0", "correlation_id": "request-1"})
+    batch = Message(1, {"action": "validate_tokens", "access_tokens": ["t1", "t2"], "correlation_id": "request-2"})
+
+    replies = await process_validation_request([single, batch], None)
+
+    pool.verify_tokens.assert_awaited_once_with(["t0", "t1", "t2"])
+    assert replies == [
+        Reply("user-validation-response", {"cognito_id": "single", "correlation_id": "request-1"}, "request-1", "request-1", single),
+        Reply("user-validation-response", {
+            "results": [{"cognito_id": "first"}, {"cognito_id": None, "error": "Token is invalid"}],
+            "correlation_id": "request-2",
+        }, "request-2", "request-2", batch),
+    ]
+
+
+@pytest.mark.asyncio
+@patch("app.main.get_verification_pool")
+async def test_process_validation_request_drops_invalid_single_tokens(mock_get_pool):
+    mock_get_pool.return_value = Mock(verify_tokens=AsyncMock(return_value=[(None, ValueError("Public key not found"))]))
+
+    replies = await process_validation_request([Message(0, {"action": "validate_token", "access_token": "bad"})], None)
+
+    assert replies == []
+
+
+@pytest.mark.asyncio
+@patch("app.main.get_verification_pool")
+async def test_validation_replies_expire_with_their_tokens(mock_get_pool):
+    mock_get_pool.return_value = Mock(verify_tokens=AsyncMock(return_value=[
+        ({"sub": "single", "exp": 300}, None),
+        ({"sub": "first", "exp": 200}, None),
+        ({"sub": "second", "exp": 100}, None),
+    ]))
+    single = Message(0, {"action": "validate_token", "access_token": "t0"})
+    batch = Message(1, {"action": "validate_tokens", "access_tokens": ["t1", "t2"]})
+
+    replies = await process_validation_request([single, batch], None)
+
+    assert [reply.expires_at for reply in replies] == [300, 100]
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.container import Container, CONNECTED, PENDING
+
+
+@pytest.mark.asyncio
+async def test_start_does_not_wait_for_backends(monkeypatch):
+    monkeypatch.setattr("app.container.CONNECT_BACKOFF", 0.01)
+    container = Container()
+    attempts = []
+
+    async def connect_database():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("MySQL not reachable yet")
+
+    with patch.object(container, "_connect_database", side_effect=connect_database), \
+            patch.object(container, "_ping_database", new_callable=AsyncMock):
+        await container.start(lambda producer: [])
+        assert container.status["database"] == PENDING
+
+        while container.status["database"] != CONNECTED:
+            await asyncio.sleep(0.01)
+        assert (await container.readiness())["database"] == CONNECTED
+
+        await container.stop()
+
+    assert len(attempts) == 3
+
+
+@pytest.mark.asyncio
+async def test_readiness_reports_lost_database():
+    container = Container()
+    container.status = {"database": CONNECTED}
+
+    with patch.object(container, "_ping_database", side_effect=ConnectionError("gone")):
+        status = await container.readiness()
+
+    assert status["database"].startswith("unreachable")
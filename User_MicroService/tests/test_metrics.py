@@ -0,0 +1,40 @@
+from collections import namedtuple
+from unittest.mock import Mock
+from prometheus_client import REGISTRY
+from app.metrics import record_consumer_lag
+
+TopicPartition = namedtuple("TopicPartition", ["topic", "partition"])
+Message = namedtuple("Message", ["offset"])
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_http_latency_is_labelled_by_route_template(client):
+    before = sample("user_service_http_request_seconds_count", method="GET", route="/health/live", status="200")
+
+    client.get("/health/live")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "user_service_http_request_seconds_bucket" in response.text
+    assert sample("user_service_http_request_seconds_count", method="GET", route="/health/live", status="200") == before + 1
+
+
+def test_queries_are_attributed_to_their_route(client, admin):
+    before = sample("user_service_db_query_seconds_count", call_site="http /users")
+
+    client.get("/users")
+
+    assert sample("user_service_db_query_seconds_count", call_site="http /users") == before + 1
+
+
+def test_consumer_lag_from_high_watermark():
+    partition = TopicPartition("requests", 0)
+    consumer = Mock()
+    consumer.highwater.return_value = 10
+
+    record_consumer_lag(consumer, {partition: [Message(3), Message(4)]})
+
+    assert sample("user_service_kafka_consumer_lag", topic="requests", partition="0") == 5
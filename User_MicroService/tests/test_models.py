@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.dialects import mysql
+from unittest.mock import AsyncMock, Mock
+from app.models.models import User, EXISTING_ROW_ID_OFFSET
+
+
+@pytest.mark.asyncio
+async def test_upsert_inserts_a_new_user(async_db_session):
+    user, created = await User.upsert(async_db_session, {"cognito_id": "new_id", "name": "New", "email": "new@example.com"})
+    await async_db_session.commit()
+
+    assert created
+    assert user.id is not None
+    assert (user.cognito_id, user.email) == ("new_id", "new@example.com")
+
+
+@pytest.mark.asyncio
+async def test_upsert_returns_the_existing_user_unchanged(async_db_session):
+    async_db_session.add(User(cognito_id="existing_id", name="Existing", email="existing@example.com", role="landlord"))
+    await async_db_session.commit()
+
+    user, created = await User.upsert(async_db_session, {"cognito_id": "other_id", "name": "Other", "email": "existing@example.com"})
+
+    assert not created
+    assert (user.cognito_id, user.name, user.role) == ("existing_id", "Existing", "landlord")
+    assert await async_db_session.scalar(select(func.count()).select_from(User)) == 1
+
+
+@pytest.mark.asyncio
+async def test_upsert_overwrites_only_the_update_columns(async_db_session):
+    async_db_session.add(User(cognito_id="existing_id", name="Existing", email="existing@example.com", role="landlord"))
+    await async_db_session.commit()
+
+    user, created = await User.upsert(async_db_session, {"cognito_id": "other_id", "name": "Other", "email": "existing@example.com",
+                                                         "role": "tenant"}, update=("role",))
+
+    assert not created
+    assert (user.cognito_id, user.name, user.role) == ("existing_id", "Existing", "tenant")
+
+
+def test_mysql_upsert_keeps_the_existing_row_id():
+    stmt = User.upsert_statement("mysql", {"cognito_id": "id", "email": "user@example.com"}, update=("role",))
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+
+    assert "ON DUPLICATE KEY UPDATE id = (last_insert_id(users.id + %s) - %s), `role` = VALUES(`role`)" in sql
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("lastrowid, row_id, created", [(7, 7, True), (EXISTING_ROW_ID_OFFSET + 7, 7, False)])
+async def test_mysql_upsert_tells_inserts_from_last_insert_id(lastrowid, row_id, created):
+    db = Mock(execute=AsyncMock(return_value=Mock(lastrowid=lastrowid)), get=AsyncMock(return_value="user"))
+    db.get_bind.return_value.dialect.name = "mysql"
+
+    assert await User.upsert(db, {"cognito_id": "id", "email": "user@example.com"}) == ("user", created)
+    assert db.get.await_args.args == (User, row_id)
+
+
+def test_upsert_rejects_unsupported_dialects():
+    with pytest.raises(ValueError, match="postgresql"):
+        User.upsert_statement("postgresql", {"cognito_id": "id", "email": "user@example.com"})
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine, text, exc
+from sqlalchemy.pool import QueuePool
+from app.pool_metrics import PoolMetrics, timed_pool_class, instrument_engine
+
+
+def make_engine(metrics, **kwargs):
+    engine = create_engine(
+        "sqlite://",
+        poolclass=timed_pool_class(QueuePool, metrics),
+        pool_size=1,
+        **kwargs
+    )
+    instrument_engine(engine, metrics)
+    return engine
+
+
+def test_checkouts_and_connects_are_counted():
+    metrics = PoolMetrics()
+    engine = make_engine(metrics, max_overflow=0)
+
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    status = metrics.snapshot(engine.pool)
+    assert status["checkouts"] == 3
+    assert status["connects"] == 1
+    assert status["checkedout"] == 0
+    assert status["size"] == 1
+
+
+def test_checkout_timeout_is_counted():
+    metrics = PoolMetrics()
+    engine = make_engine(metrics, max_overflow=0, pool_timeout=0.01)
+
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    assert metrics.snapshot(engine.pool)["checkout_timeouts"] == 1
+
+
+def test_invalidations_are_counted_across_pool_recreate():
+    metrics = PoolMetrics()
+    engine = make_engine(metrics)
+
+    with engine.connect() as conn:
+        conn.invalidate()
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    status = metrics.snapshot(engine.pool)
+    assert status["invalidations"] == 1
+    assert status["checkouts"] == 2